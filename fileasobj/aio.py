@@ -0,0 +1,108 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+FileAsObj for asyncio programs.
+"""
+import asyncio
+from functools import partial
+
+from fileasobj import FileAsObj
+
+
+class AsyncFileAsObj(FileAsObj):
+    """
+    FileAsObj with awaitable methods that never block the event loop.
+
+    File I/O and updates run in the loop's default executor; searches over contents run on the loop in chunks of
+        'chunk_lines' lines, yielding to other tasks between chunks. Every awaitable method holds one lock, so a
+        single object can be shared by many coroutines; avoid calling the plain (blocking) methods at the same time.
+    unique, sorted, changed and linesep behave exactly as they do for FileAsObj.
+    """
+
+    # Lines searched between two yields to the event loop.
+    chunk_lines = 10000
+
+    @classmethod
+    async def open(cls, filename, **options):
+        """
+        Construct a new AsyncFileAsObj and read 'filename' without blocking the event loop.
+
+        :param filename: String; file to read.
+        :param options: Keyword arguments for FileAsObj(), other than filename.
+        :return: AsyncFileAsObj.
+        """
+        this = cls(**options)
+        await this.aread(filename)
+        return this
+
+    @property
+    def _lock(self):
+        """ asyncio.Lock serialising the awaitable methods, created in the running loop on first use. """
+        lock = self.__dict__.get('_async_lock')
+        if lock is None:
+            lock = self.__dict__['_async_lock'] = asyncio.Lock()
+        return lock
+
+    async def _run(self, method, *args):
+        """ Await 'method' called with 'args' in the default executor, while holding the lock. """
+        async with self._lock:
+            return await asyncio.get_running_loop().run_in_executor(None, partial(method, *args))
+
+    async def aread(self, given_file):
+        """ Awaitable FileAsObj.read(). """
+        return await self._run(self.read, given_file)
+
+    async def awrite(self):
+        """ Awaitable FileAsObj.write(). """
+        return await self._run(self.write)
+
+    async def asave(self):
+        """ Alias method, some use-cases prefer .asave() over .awrite(). """
+        return await self.awrite()
+
+    async def aadd(self, line):
+        """ Awaitable FileAsObj.add(). """
+        return await self._run(self.add, line)
+
+    async def arm(self, line):
+        """ Awaitable FileAsObj.rm(). """
+        return await self._run(self.rm, line)
+
+    async def areplace(self, old, new):
+        """ Awaitable FileAsObj.replace(). """
+        return await self._run(self.replace, old, new)
+
+    async def asort(self, key=None, reverse=False):
+        """ Awaitable FileAsObj.sort(). """
+        return await self._run(self.sort, key, reverse)
+
+    async def _scan(self, test):
+        """
+        Return the lines for which 'test' is true, or False if none are.
+
+        Lines in memory are searched on the loop a chunk at a time; a lazy file is streamed in the executor.
+        """
+        if self._streaming():
+            result = await self._run(lambda: [line for line in self._lines() if test(line)])
+        else:
+            result = []
+            async with self._lock:
+                contents = self.contents
+                for start in range(0, len(contents), self.chunk_lines):
+                    result.extend(line for line in contents[start:start + self.chunk_lines] if test(line))
+                    await asyncio.sleep(0)
+        if result:
+            return result
+        return False
+
+    async def agrep(self, needle):
+        """ Awaitable FileAsObj.grep(), yielding to the event loop during long searches. """
+        return await self._scan(lambda line: needle in line)
+
+    async def aegrep(self, pattern, flags=0):
+        """ Awaitable FileAsObj.egrep(), yielding to the event loop during long searches. """
+        return await self._scan(self.patterns.compile(pattern, flags).search)
+
+    async def acheck(self, line):
+        """ Awaitable FileAsObj.check(). """
+        return await self._run(self.check, line)
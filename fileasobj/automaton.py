@@ -0,0 +1,101 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Aho-Corasick automaton used by FileAsObj.grep_any(), .grep_all() and .grep_which() to find many substrings in
+one pass over each line.
+"""
+
+
+class Automaton(object):
+    """
+    Match any number of needles against a line in a single scan of that line.
+
+    The trie of needles is built once, with failure links so the scan never backs up; the cost of searching a line
+        depends on the length of the line and the matches found, not on how many needles there are.
+    """
+
+    def __init__(self, needles):
+        """
+        Build the automaton.
+
+        :param needles: List of Strings; substrings to look for, duplicates are ignored.
+        """
+        self.needles = list()
+        seen = dict()
+        for needle in needles:
+            if needle not in seen:
+                seen[needle] = len(self.needles)
+                self.needles.append(needle)
+        #
+        # State 0 is the root. goto[state] maps a character to the next state, fail[state] is the state for the
+        # longest proper suffix that is also in the trie and output[state] lists needle numbers ending here.
+        self.goto = [dict()]
+        self.fail = [0]
+        self.output = [list()]
+        for number, needle in enumerate(self.needles):
+            state = 0
+            for char in needle:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][char] = following
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append(list())
+                state = following
+            self.output[state].append(number)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                found = self.goto[fallback].get(char, 0)
+                self.fail[following] = found if found != following else 0
+                self.output[following] = self.output[following] + self.output[self.fail[following]]
+
+    def __len__(self):
+        """ Return how many distinct needles the automaton matches. """
+        return len(self.needles)
+
+    def search(self, line):
+        """
+        Find which needles occur in 'line'.
+
+        :param line: String; text to scan.
+        :return: Set of Integers; positions in self.needles of every needle found.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        found = set(output[0])  # An empty needle matches every line.
+        state = 0
+        for char in line:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def first(self, line):
+        """
+        Return True as soon as any needle is found in 'line', False if none is.
+
+        :param line: String; text to scan.
+        :return: Boolean.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        if output[0]:
+            return True
+        state = 0
+        for char in line:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
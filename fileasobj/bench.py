@@ -0,0 +1,247 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Benchmarks for FileAsObj, run with:
+
+    python -m fileasobj.bench [--quick] [--sizes 1000,100000] [--output results.json]
+
+Synthetic hosts-style files are generated for each size, then every public method is timed with unique and sorted
+    on and off. The cost of creating many objects is measured too. Results, including peak memory measured with
+    tracemalloc, are printed as JSON so runs of different releases can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fileasobj import FileAsObj, __version__
+
+# Line counts of the generated files; --quick stops at 100k.
+SIZES = (1000, 10000, 100000, 1000000, 10000000)
+QUICK_SIZES = (1000, 10000, 100000)
+
+# Lines given to add() by the 'add_batch' operation and appended to the file before 'refresh'.
+BATCH = 1000
+
+# Objects made by construction().
+OBJECTS = 100000
+
+
+def line(number):
+    """
+    Return synthetic line 'number', shaped like a hosts file entry. One line in ten repeats an earlier one so that
+        unique=True has work to do.
+
+    :param number: Integer; position of the line in the file.
+    :return: String.
+    """
+    while number % 10 == 9:
+        number //= 10
+    return '10.{0}.{1}.{2}    host{3}.example.com host{3}'.format(number >> 16 & 255, number >> 8 & 255,
+                                                                  number & 255, number)
+
+
+def generate(filename, size):
+    """ Write a synthetic file of 'size' lines to 'filename'. """
+    with open(filename, 'w') as handle:
+        for start in range(0, size, 65536):
+            chunk = [line(number) for number in range(start, min(start + 65536, size))]
+            chunk.append('')
+            handle.write('\n'.join(chunk))
+
+
+def _append_batch(test_file, size):
+    """ Grow the file on disk by BATCH lines, ready for refresh(). """
+    with open(test_file.filename, 'a') as handle:
+        handle.write(''.join(line(size + number) + '\n' for number in range(BATCH)))
+
+
+# (name, prepare, run, writes the file) for every operation. 'prepare' runs untimed on a freshly read FileAsObj,
+# 'run' is what is measured. Operations that write get their own copy of the file.
+OPERATIONS = (
+    ('read', None, lambda test_file, size: test_file.read(test_file.filename), False),
+    ('check', None, lambda test_file, size: (test_file.check(line(size // 2)), test_file.check('missing')), False),
+    ('contains', None, lambda test_file, size: line(size - 1) in test_file, False),
+    ('add', None, lambda test_file, size: test_file.add(line(size)), False),
+    ('add_batch', None, lambda test_file, size: test_file.add([line(size + number) for number in range(BATCH)]),
+     False),
+    ('rm', None, lambda test_file, size: test_file.rm(line(size // 2)), False),
+    ('replace', None, lambda test_file, size: test_file.replace(line(size // 2), 'replaced'), False),
+    ('grep', None, lambda test_file, size: test_file.grep('host1'), False),
+    ('egrep', None, lambda test_file, size: test_file.egrep(r'^10\.0\.1\.'), False),
+    ('egrep_many', None, lambda test_file, size: test_file.egrep_many([r'^10\.0\.1\.', r'host7$', r'\.9\.']), False),
+    ('grep_any', None, lambda test_file, size: test_file.grep_any(['host{0}'.format(this) for this in range(10)]),
+     False),
+    ('grep_all', None, lambda test_file, size: test_file.grep_all(['10.0.', 'host5']), False),
+    ('grep_which', None, lambda test_file, size: test_file.grep_which(['10.0.', 'host5', 'example']), False),
+    ('sort', None, lambda test_file, size: test_file.sort(), False),
+    ('iter', None, lambda test_file, size: sum(1 for this in test_file), False),
+    ('str', None, lambda test_file, size: str(test_file), False),
+    ('write', lambda test_file, size: test_file.rm(line(size // 2)), lambda test_file, size: test_file.write(), True),
+    ('append_write', lambda test_file, size: test_file.add(line(size)), lambda test_file, size: test_file.write(),
+     True),
+    ('refresh', _append_batch, lambda test_file, size: test_file.refresh(), True),
+    ('reload_if_changed', None, lambda test_file, size: test_file.reload_if_changed(), False),
+)
+
+
+def measure(operation, size, filename, unique, ordered, repeat=3, memory=True):
+    """
+    Time one operation on a file.
+
+    :param operation: Tuple; one of OPERATIONS.
+    :param size: Integer; lines in 'filename'.
+    :param filename: String; file to work on, operations that write work on a copy beside it.
+    :param unique: Boolean; FileAsObj.unique.
+    :param ordered: Boolean; FileAsObj.sorted.
+    :param repeat: Integer; timed runs, the fastest is kept.
+    :param memory: Boolean; also make one run under tracemalloc to record peak memory, which is not timed.
+    :return: Dict; size, unique, sorted, operation, seconds and peak_bytes (None without 'memory').
+    """
+    name, prepare, run, writes = operation
+
+    def setup():
+        """ Return a FileAsObj ready for 'run', read unless the operation is 'read' itself. """
+        test_file = FileAsObj()
+        test_file.unique = unique
+        test_file.sorted = ordered
+        test_file.filename = filename
+        if writes:
+            test_file.filename = filename + '.copy'
+            shutil.copyfile(filename, test_file.filename)
+        if name != 'read':
+            test_file.read(test_file.filename)
+        if prepare is not None:
+            prepare(test_file, size)
+        return test_file
+
+    best = None
+    for _ in range(max(repeat, 1)):
+        test_file = setup()
+        start = time.perf_counter()
+        run(test_file, size)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    peak = None
+    if memory:
+        test_file = setup()
+        tracemalloc.start()
+        try:
+            run(test_file, size)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'size': size, 'unique': unique, 'sorted': ordered, 'operation': name, 'seconds': best, 'peak_bytes': peak}
+
+
+def construction(count=OBJECTS):
+    """
+    Measure creating 'count' empty FileAsObj at once, as batch jobs handling many files do.
+
+    :param count: Integer; objects to create.
+    :return: Dict; objects, seconds, per_second, and bytes_per_object held by each object before and after its first
+        log event (bytes_per_logged_object).
+    """
+    start = time.perf_counter()
+    objects = [FileAsObj() for _ in range(count)]
+    seconds = time.perf_counter() - start
+    del objects
+    tracemalloc.start()
+    try:
+        objects = [FileAsObj() for _ in range(count)]
+        held = tracemalloc.get_traced_memory()[0] - sys.getsizeof(objects)
+        for this in objects:
+            this.log('event')
+        logged = tracemalloc.get_traced_memory()[0] - sys.getsizeof(objects)
+    finally:
+        tracemalloc.stop()
+    return {'objects': count, 'seconds': seconds, 'per_second': count / seconds if seconds else None,
+            'bytes_per_object': held // count, 'bytes_per_logged_object': logged // count}
+
+
+def bench(sizes=SIZES, repeat=3, memory=True, operations=None, directory=None, report=None, objects=OBJECTS):
+    """
+    Run operations at every size with unique and sorted on and off.
+
+    :param sizes: List of Integers; line counts of the files to generate.
+    :param repeat: Integer; timed runs per measurement, the fastest is kept.
+    :param memory: Boolean; whether to also record peak memory with tracemalloc.
+    :param operations: List of Strings; (optional) names of the operations to run, all of OPERATIONS by default.
+    :param directory: String; (optional) where to write the files, a temporary directory by default.
+    :param report: Callable; (optional) called with each result as it is measured, e.g. to show progress.
+    :param objects: Integer; objects to create for construction(), 0 to skip it.
+    :return: Dict; details of this run, its List of results and the construction() figures.
+    """
+    chosen = [this for this in OPERATIONS if operations is None or this[0] in operations]
+    scratch = tempfile.mkdtemp(prefix='fileasobj-bench-', dir=directory)
+    results = []
+    try:
+        for size in sizes:
+            filename = os.path.join(scratch, '{0}.txt'.format(size))
+            generate(filename, size)
+            for unique in (False, True):
+                for ordered in (False, True):
+                    for operation in chosen:
+                        result = measure(operation, size, filename, unique, ordered, repeat, memory)
+                        results.append(result)
+                        if report is not None:
+                            report(result)
+            os.unlink(filename)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        'fileasobj': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'repeat': repeat,
+        'results': results,
+        'construction': construction(objects) if objects > 0 else None,
+    }
+
+
+def main(argv=None):
+    """ Command line entry point, see the module docstring. """
+    parser = argparse.ArgumentParser(prog='python -m fileasobj.bench', description='Benchmark FileAsObj.')
+    parser.add_argument('--sizes', help='comma separated line counts, default {0}'.format(
+        ','.join(str(this) for this in SIZES)))
+    parser.add_argument('--quick', action='store_true', help='only sizes up to {0} lines'.format(QUICK_SIZES[-1]))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement, the fastest is kept')
+    parser.add_argument('--operations', help='comma separated operations, default all: {0}'.format(
+        ','.join(this[0] for this in OPERATIONS)))
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc peak memory measurements')
+    parser.add_argument('--objects', type=int, default=OBJECTS, help='objects to create when timing construction, '
+                                                                      '0 to skip')
+    parser.add_argument('--directory', help='where to generate files, default a temporary directory')
+    parser.add_argument('--output', help='write JSON here instead of to stdout')
+    args = parser.parse_args(argv)
+    sizes = QUICK_SIZES if args.quick else SIZES
+    if args.sizes:
+        sizes = [int(this) for this in args.sizes.split(',')]
+    operations = args.operations.split(',') if args.operations else None
+
+    def report(result):
+        """ Show progress on stderr, keeping stdout for the JSON. """
+        sys.stderr.write('{size:>9} unique={unique!s:<5} sorted={sorted!s:<5} {operation:<18} {seconds:.6f}s\n'.format(
+            **result))
+
+    results = bench(sizes, args.repeat, not args.no_memory, operations, args.directory, report, args.objects)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Manage many files at once, for example a directory of host or allowlist files.
+"""
+from collections import OrderedDict
+
+from fileasobj import FileAsObj
+
+
+class FileAsObjSet(object):
+    """
+    A collection of FileAsObj, one per file, loaded and saved with a pool of threads so many small files cost
+        about as much as the disk needs to read them.
+
+    Searches return (filename, line) pairs so results can be traced back to the file they came from.
+    """
+
+    def __init__(self, filenames=None, workers=16, factory=FileAsObj):
+        """
+        Construct a new FileAsObjSet.
+
+        :param filenames: List of Strings; (optional) files to read.
+        :param workers: Integer; how many threads read or write files at once.
+        :param factory: Callable; (optional) given a filename, returns a read FileAsObj. Use this to set
+            unique, sorted or other options on every member.
+        """
+        self.workers = workers
+        self.factory = factory
+        #
+        # filename -> FileAsObj, in the order files were given.
+        self.members = OrderedDict()
+        if filenames is not None:
+            self.read(filenames)
+
+    def _map(self, function, items):
+        """ Call 'function' on every item using the thread pool, return the results in the order of 'items'. """
+        if len(items) < 2 or self.workers < 2:
+            return [function(this) for this in items]
+        from concurrent.futures import ThreadPoolExecutor  # Not at the top, it slows down 'import fileasobj'.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(function, items))
+
+    def read(self, filenames):
+        """
+        Read every file in 'filenames' concurrently and add it to the set, replacing a member of the same name.
+        Like FileAsObj.read() the first error met (such as a missing file) is raised.
+
+        :param filenames: List of Strings; files to read.
+        :return: True
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        if not isinstance(filenames, list):
+            raise TypeError("Parameter 'filenames' not a 'string' or 'list', is {0}".format(type(filenames)))
+        for filename, member in zip(filenames, self._map(self.factory, filenames)):
+            self.members[filename] = member
+        return True
+
+    def reload(self):
+        """ Read every member again from disk, discarding unsaved changes. """
+        return self.read(list(self.members))
+
+    def _search(self, method, *args):
+        """ Run FileAsObj 'method' on each member, return (filename, line) for every line found, or False. """
+        result = []
+        for filename, member in self.members.items():
+            found = getattr(member, method)(*args)
+            if found:
+                result.extend((filename, line) for line in found)
+        if result:
+            return result
+        return False
+
+    def grep(self, needle):
+        """
+        Search every file for substring 'needle', see FileAsObj.grep().
+
+        :param needle: String; word or phrase to search for.
+        :return: List of (filename, line) Tuples, or False.
+        """
+        return self._search('grep', needle)
+
+    def egrep(self, pattern, flags=0):
+        """
+        REGEX search every file for 'pattern', see FileAsObj.egrep().
+
+        :param pattern: String or compiled pattern; regex pattern to search for.
+        :param flags: Integer; (optional) 're' flags, only for String patterns.
+        :return: List of (filename, line) Tuples, or False.
+        """
+        return self._search('egrep', pattern, flags)
+
+    def check(self, line):
+        """
+        Find every file containing the whole line 'line', see FileAsObj.check().
+
+        :param line: String; whole line to find.
+        :return: List of (filename, line) Tuples, or False.
+        """
+        result = [(filename, line) for filename, member in self.members.items() if member.check(line) is not False]
+        if result:
+            return result
+        return False
+
+    @property
+    def changed(self):
+        """ List of Strings; names of the members changed since they were read or saved. """
+        return [filename for filename, member in self.members.items() if member.changed]
+
+    def save(self):
+        """
+        Write every changed member concurrently, unchanged files are left alone.
+
+        :return: List of Strings; names of the files written.
+        """
+        dirty = self.changed
+        self._map(lambda filename: self.members[filename].save(), dirty)
+        return dirty
+
+    def __len__(self):
+        """ Return how many files are in the set. """
+        return len(self.members)
+
+    def __iter__(self):
+        """ Iterate over the FileAsObj members. """
+        return iter(self.members.values())
+
+    def __getitem__(self, filename):
+        """ Return the FileAsObj for 'filename'. """
+        return self.members[filename]
+
+    def __contains__(self, filename):
+        """ Return True if 'filename' is in the set. """
+        return filename in self.members
@@ -0,0 +1,105 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Column schemas for structured line files such as /etc/hosts, /etc/passwd or simple CSV.
+"""
+import re
+
+
+class Fields(object):
+    """
+    Schema splitting each line into named columns, used by FileAsObj(fields=...) and FileAsObj.find().
+
+    A line is split on 'delimiter' (any run of whitespace by default) into at most len(columns) parts, so the last
+        column keeps the rest of the line; or, if 'pattern' is given, matched against it with each group being a
+        column. Blank lines, lines starting with 'comment' and lines the pattern does not match have no fields.
+
+        Fields(['address', 'hostname', 'aliases'], comment='#')  # /etc/hosts
+        Fields(['user', 'password', 'uid', 'gid', 'gecos', 'home', 'shell'], delimiter=':')  # /etc/passwd
+    """
+
+    def __init__(self, columns, delimiter=None, pattern=None, comment=None, indexed=None):
+        """
+        Define a schema.
+
+        :param columns: List of Strings; column names, in the order they appear in a line.
+        :param delimiter: String; (optional) separator between columns, any whitespace if None.
+        :param pattern: String or compiled pattern; (optional) regex whose groups are the columns, used instead of
+            'delimiter'.
+        :param comment: String; (optional) lines starting with this, after leading whitespace, have no fields.
+        :param indexed: List of Strings; (optional) columns FileAsObj keeps hash indexes on, all by default.
+        """
+        self.columns = list(columns)
+        self.delimiter = delimiter
+        self.pattern = re.compile(pattern) if isinstance(pattern, (str, bytes)) else pattern
+        self.comment = comment
+        self.indexed = list(self.columns if indexed is None else indexed)
+        self._numbers = dict((name, number) for number, name in enumerate(self.columns))
+        self._last = (None, None)  # (line, its fields) last split by a key function.
+        for name in self.indexed:
+            self.number(name)
+
+    def number(self, column):
+        """
+        Return the position of 'column' in a line.
+
+        :param column: String; column name.
+        :return: Integer.
+        """
+        number = self._numbers.get(column)
+        if number is None:
+            raise ValueError("Column '{0}' not one of {1}".format(column, self.columns))
+        return number
+
+    def split(self, line):
+        """
+        Return the List of fields in 'line', or None if it has none. Missing trailing columns are left out.
+
+        :param line: String; one line.
+        :return: List of Strings, or None.
+        """
+        stripped = line.strip()
+        if not stripped or (self.comment is not None and stripped.startswith(self.comment)):
+            return None
+        if self.pattern is not None:
+            match = self.pattern.match(line)
+            if match is None:
+                return None
+            return list(match.groups())
+        return line.split(self.delimiter, len(self.columns) - 1)
+
+    def parse(self, line):
+        """
+        Return the fields of 'line' by column name.
+
+        :param line: String; one line.
+        :return: Dict, or None if the line has no fields.
+        """
+        fields = self.split(line)
+        if fields is None:
+            return None
+        return dict(zip(self.columns, fields))
+
+    def key(self, column):
+        """
+        Return a function giving the value of 'column' in a line, or None where the line has no such field.
+        The key functions of a schema share the fields of the last line split, so indexing several columns splits
+            each line once when they are called in turn on it.
+
+        :param column: String; column name.
+        :return: Callable.
+        """
+        number = self.number(column)
+        split = self.split
+
+        def key(line):
+            last = self._last
+            if last[0] is line:
+                fields = last[1]
+            else:
+                fields = split(line)
+                self._last = (line, fields)
+            if fields is None or len(fields) <= number:
+                return None
+            return fields[number]
+        return key
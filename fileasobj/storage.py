@@ -0,0 +1,204 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Storage for the lines of a file: Lines, a list that knows when it was changed, and compact, read-only storage for
+the lines of large files.
+"""
+import itertools
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+
+# Source of 'version' numbers. Every state of every Lines or CompactLines gets a number no other state had, so an
+# index stamped with a version is in step exactly while the lines it was built from still carry that version.
+_versions = itertools.count(1)
+
+
+class Lines(list):
+    """
+    A list of lines that takes a new 'version' number whenever it is changed in place.
+
+    FileAsObj.contents is a Lines so that indexes over it notice edits made straight to the list, such as
+        my_file.contents[0] = 'x' or my_file.contents.sort(), and are rebuilt instead of giving stale answers.
+    Reading it costs the same as reading a list; each call that changes it costs one extra counter step.
+    """
+    __slots__ = ('version',)
+
+    def __init__(self, lines=()):
+        """
+        Build a new Lines.
+
+        :param lines: Iterable of Strings; the lines to store.
+        """
+        list.__init__(self, lines)
+        self.version = next(_versions)
+
+
+def _changes(name):
+    """ Return list method 'name' wrapped to give the Lines a new version after it runs. """
+    method = getattr(list, name)
+
+    def changed(self, *args, **options):
+        result = method(self, *args, **options)
+        self.version = next(_versions)
+        return result
+    changed.__name__ = name
+    changed.__doc__ = method.__doc__
+    return changed
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop', 'remove',
+              'clear', 'sort', 'reverse'):
+    setattr(Lines, _name, _changes(_name))
+del _name
+
+
+class CompactLines(Sequence):
+    """
+    Lines kept as one string plus an array of where each line starts, instead of one object per line.
+
+    A list of lines costs a pointer and a whole string object (about 50 bytes of overhead) per line; here each line
+        costs its characters, one separator and a 4 byte offset (8 bytes past 4 GiB of text). Lines are only created
+        as they are read.
+
+    Behaves like a read-only list: len(), indexing, slicing (returns a List), iteration, 'in' and == with a list.
+    Lines may not contain the separator, which is always true for lines read from a file.
+    """
+
+    # Lines split out of the buffer at a time while iterating.
+    chunk_lines = 4096
+
+    def __init__(self, lines=(), separator='\n'):
+        """
+        Pack 'lines' into a new CompactLines.
+
+        :param lines: Iterable of Strings; the lines to store.
+        :param separator: String; one character joining lines inside the buffer.
+        """
+        self.separator = separator
+        self.version = next(_versions)  # Never changes, see Lines.
+        self.offsets = array('Q', [0])
+        parts = list()
+        position = 0
+        for line in lines:
+            position += len(line) + 1
+            self.offsets.append(position)
+            parts.append(line)
+        self.buffer = separator.join(parts)
+        self._shrink()
+
+    @classmethod
+    def from_text(cls, text, separator='\n'):
+        """
+        Build a CompactLines straight from the text of a file, without splitting it into line objects.
+
+        :param text: String; whole file, lines ended (or separated) by 'separator'.
+        :param separator: String; line separator used in 'text'.
+        :return: CompactLines.
+        """
+        this = cls(separator=separator)
+        if text.endswith(separator):
+            text = text[:-1]
+        elif not text:
+            return this
+        this.buffer = text
+        offsets = this.offsets
+        find = text.find
+        position = find(separator)
+        while position != -1:
+            offsets.append(position + 1)
+            position = find(separator, position + 1)
+        offsets.append(len(text) + 1)
+        this._shrink()
+        return this
+
+    def _shrink(self):
+        """ Halve the offsets table by storing them in 4 bytes when the buffer is small enough. """
+        if self.offsets.typecode == 'Q' and len(self.buffer) < 0xFFFFFFFF and array('I').itemsize == 4:
+            self.offsets = array('I', self.offsets)
+
+    def __len__(self):
+        """ Return the number of lines. """
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        """ Return one line as a String, or a slice of lines as a List of Strings. """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[this] for this in range(start, stop, step)]
+            if start >= stop:
+                return list()
+            return self.buffer[self.offsets[start]:self.offsets[stop] - 1].split(self.separator)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('CompactLines index out of range')
+        return self.buffer[self.offsets[item]:self.offsets[item + 1] - 1]
+
+    def __iter__(self):
+        """ Iterate over the lines, splitting chunk_lines of them out of the buffer at a time. """
+        for start in range(0, len(self), self.chunk_lines):
+            for line in self[start:start + self.chunk_lines]:
+                yield line
+
+    def __contains__(self, line):
+        """ Return True if 'line' is one of the lines, searching the buffer without creating lines. """
+        if self.separator in line or not len(self):
+            return False
+        buffer = self.buffer
+        position = buffer.find(line)
+        while position != -1:
+            end = position + len(line)
+            if (position == 0 or buffer[position - 1:position] == self.separator) and \
+                    (end == len(buffer) or buffer[end:end + 1] == self.separator):
+                return True
+            position = buffer.find(line, position + 1)
+        return False
+
+    def grep(self, needle):
+        """
+        Return the List of lines containing substring 'needle', searching the buffer directly.
+
+        :param needle: String; substring to find.
+        :return: List of Strings.
+        """
+        result = list()
+        if not len(self) or self.separator in needle:
+            return result
+        if not needle:
+            return list(self)
+        buffer = self.buffer
+        offsets = self.offsets
+        position = buffer.find(needle)
+        while position != -1:
+            number = bisect_right(offsets, position) - 1
+            result.append(self[number])
+            position = buffer.find(needle, offsets[number + 1])
+        return result
+
+    def __eq__(self, other):
+        """ Compare line by line with another CompactLines, a List or a Tuple. """
+        if isinstance(other, CompactLines):
+            return self.buffer == other.buffer and self.offsets == other.offsets
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        """ Opposite of __eq__(). """
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __sizeof__(self):
+        """ Return the bytes used by the buffer and offsets. """
+        return object.__sizeof__(self) + sys.getsizeof(self.buffer) + sys.getsizeof(self.offsets)
+
+    def __repr__(self):
+        """ Summarise rather than print every line. """
+        return '<CompactLines: {0} lines>'.format(len(self))
@@ -0,0 +1,86 @@
+""" -*- coding: utf-8 -*-
+https://github.com/jhazelwo/python-fileasobj
+
+Inverted trigram index used by FileAsObj.grep() while FileAsObj.grep_index is True.
+"""
+from array import array
+from collections import defaultdict
+
+
+def trigrams(text):
+    """ Return the Set of 3 character substrings of 'text' (3 byte substrings of bytes). """
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+class Trigrams(object):
+    """
+    Map every trigram to the distinct lines containing it, so a substring search only checks the lines that hold the
+        rarest trigram of its needle instead of every line.
+
+    Lines are numbered as they are added and each trigram keeps an array of 4 byte line numbers, far smaller than a
+        set of lines. Removed lines are only blanked out of the numbering; .stale() says when so many are gone that
+        building the index again is worth it.
+    """
+
+    def __init__(self, lines=()):
+        """
+        Build the index.
+
+        :param lines: Iterable of Strings; distinct lines to index.
+        """
+        self.postings = defaultdict(lambda: array('I'))
+        self.lines = list()
+        self.numbers = dict()
+        self.removed = 0
+        for line in lines:
+            self.add(line)
+
+    def add(self, line):
+        """ Index 'line' unless it already is. """
+        if line in self.numbers:
+            return
+        number = len(self.lines)
+        self.numbers[line] = number
+        self.lines.append(line)
+        postings = self.postings
+        for gram in trigrams(line):
+            postings[gram].append(number)
+
+    def discard(self, line):
+        """ Forget 'line' if it is indexed. """
+        number = self.numbers.pop(line, None)
+        if number is not None:
+            self.lines[number] = None
+            self.removed += 1
+
+    def stale(self):
+        """ Return True once more lines were removed than are left, so that rebuilding would halve the index. """
+        return self.removed > len(self.numbers)
+
+    def search(self, needle, limit):
+        """
+        Return the distinct indexed lines containing 'needle'.
+
+        :param needle: String; substring to find, at least 3 characters long.
+        :param limit: Integer; give up if the rarest trigram of 'needle' is in more lines than this.
+        :return: List of Strings, or None if 'needle' is too short or too common for the index to help.
+        """
+        if len(needle) < 3:
+            return None
+        postings = self.postings
+        rarest = None
+        for gram in trigrams(needle):
+            found = postings.get(gram)
+            if found is None:
+                return []
+            if rarest is None or len(found) < len(rarest):
+                rarest = found
+        if len(rarest) > limit:
+            return None
+        lines = self.lines
+        result = list()
+        for number in rarest:
+            line = lines[number]
+            if line is not None and needle in line:
+                result.append(line)
+        return result
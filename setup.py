@@ -5,12 +5,12 @@ from distutils.core import setup
 setup(
     name='fileasobj',
     packages=['fileasobj'],
-    version='2.0.0',
+    version='3.0.0',
     description='Manage a file as a Python list.',
     author='John Hazelwood',
     author_email='jhazelwo@users.noreply.github.com',
     url='https://github.com/jhazelwo/python-fileasobj',
-    download_url='https://github.com/jhazelwo/python-fileasobj/tarball/2.0.0',
+    download_url='https://github.com/jhazelwo/python-fileasobj/tarball/3.0.0',
     keywords=['python', 'file', 'fileasobj'],
     license='MIT',
     # See https://pypi.python.org/pypi?%3Aaction=list_classifiers
@@ -20,9 +20,13 @@ setup(
         'Topic :: Utilities',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
+    python_requires='>=3.7',
 )
@@ -10,8 +10,17 @@ Hint:
 # PYTHONPATH=`pwd` python3 tests/tests_fileasobj.py
 
 """
+import asyncio
+import errno
+import os
+import re
+import sys
+import threading
 import unittest
-from fileasobj import FileAsObj
+from fileasobj import AsyncFileAsObj, FileAsObj, FileAsObjSet
+from fileasobj import bench, Fields
+from fileasobj.automaton import Automaton
+from fileasobj.storage import CompactLines
 
 TESTFILE = '/tmp/test_fileasobj.txt'  # Change me on Windows
 
@@ -141,6 +150,40 @@ class TestLog(unittest.TestCase):
         test_file = FileAsObj()
         self.assertTrue(str(test_file.log.tag))
 
+    def test_log_size_bounded(self):
+        """ Test log keeps only the newest events. """
+        test_file = FileAsObj(log_size=3)
+        for this in range(10):
+            test_file.log('event {0}', this)
+        self.assertEqual(len(test_file.log.events), 3)
+        self.assertTrue('event 9' in str(test_file.log))
+        self.assertFalse('event 6' in str(test_file.log))
+
+    def test_log_formats_lazily(self):
+        """ Test events are stored raw and formatted on read. """
+        test_file = FileAsObj()
+        test_file.log('{0} and {1}', 'this', 'that')
+        when, event, args = test_file.log.events[-1]
+        self.assertEqual(event, '{0} and {1}')
+        self.assertEqual(args, ('this', 'that'))
+        self.assertTrue('this and that' in str(test_file.log))
+        test_file.log('braces {} without args are kept')
+        self.assertTrue('braces {} without args are kept' in str(test_file.log))
+
+    def test_log_created_on_first_use(self):
+        """ Test the log is only made when used, starting with the init event. """
+        test_file = FileAsObj(logging=True)
+        self.assertIsNone(test_file._log)
+        self.assertTrue('init(filename=None):' in str(test_file.log))
+        self.assertTrue(test_file.log.tag.endswith('[{0}]'.format(os.getpid())))
+        self.assertEqual(str(FileAsObj(logging=False).log), '')
+
+    def test_log_does_not_hold_lists(self):
+        """ Test a list passed to add() is summarised rather than kept by the log. """
+        test_file = FileAsObj()
+        test_file.add(['a', 'b', 'c'])
+        self.assertTrue('add(<3 lines>)' in str(test_file.log))
+
 
 class TestRead(unittest.TestCase):
     # def read(self, given_file):
@@ -178,6 +221,340 @@ class TestRead(unittest.TestCase):
             test_file.read(TESTFILE)
 
 
+class TestReadCache(unittest.TestCase):
+    # class ReadCache(object):
+    # def reload_if_changed(self):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS)
+        test_file.save()
+        FileAsObj.read_cache.clear()
+
+    def test_cache_hit(self):
+        """ An unchanged file is shared from the cache instead of read again. """
+        first = FileAsObj(TESTFILE, cache=True)
+        second = FileAsObj(TESTFILE, cache=True)
+        self.assertEqual(FileAsObj.read_cache.stats()['hits'], 1)
+        self.assertIs(first.contents, second.contents)
+        self.assertEqual(second.contents, TESTCONTENTS.split('\n'))
+        self.assertEqual(FileAsObj(TESTFILE, cache=True, compact=True).contents, first.contents)
+        realpath = os.path.realpath
+        os.path.realpath = None  # A hit costs one stat(), no path resolution.
+        try:
+            self.assertIs(FileAsObj(TESTFILE, cache=True).contents, first.contents)
+        finally:
+            os.path.realpath = realpath
+
+    def test_copy_on_write(self):
+        """ Changing one reader leaves the cached contents and other readers alone. """
+        first = FileAsObj(TESTFILE, cache=True)
+        self.assertTrue(first.add('10.9.9.9 new'))
+        self.assertTrue(first.rm('#comment'))
+        second = FileAsObj(TESTFILE, cache=True)
+        self.assertEqual(second.contents, TESTCONTENTS.split('\n'))
+        self.assertFalse(second.check('10.9.9.9 new'))
+
+    def test_cache_invalidation(self):
+        """ A written file is read again. """
+        first = FileAsObj(TESTFILE, cache=True)
+        first.add('10.9.9.9 new')
+        first.write()
+        second = FileAsObj(TESTFILE, cache=True)
+        self.assertEqual(FileAsObj.read_cache.stats()['hits'], 0)
+        self.assertTrue(second.check('10.9.9.9 new'))
+        self.assertEqual(FileAsObj.read_cache.stats()['entries'], 1)
+
+    def test_cache_limits(self):
+        """ The least recently used file is dropped when either limit is passed. """
+        cache = FileAsObj.read_cache.__class__(entries=2, size=100)
+        cache.put((('/a',), False), ('a', True), 10)
+        cache.put((('/b',), False), ('b', True), 10)
+        self.assertEqual(cache.get((('/a',), False)), ('a', True))
+        cache.put((('/c',), False), ('c', True), 10)
+        self.assertIsNone(cache.get((('/b',), False)))
+        cache.put((('/d',), False), ('d', True), 85)
+        self.assertIsNone(cache.get((('/a',), False)))
+        self.assertEqual(cache.stats()['bytes'], 95)
+        cache.put((('/e',), False), ('e', True), 101)
+        self.assertIsNone(cache.get((('/e',), False)))
+
+    def test_reload_if_changed(self):
+        """ Only a file changed on disk is read again. """
+        test_file = FileAsObj(TESTFILE)
+        self.assertFalse(test_file.reload_if_changed())
+        other = FileAsObj(TESTFILE)
+        other.add('10.9.9.9 new')
+        other.save()
+        self.assertTrue(test_file.reload_if_changed())
+        self.assertTrue(test_file.check('10.9.9.9 new'))
+        self.assertFalse(test_file.changed)
+        self.assertFalse(test_file.reload_if_changed())
+
+
+class TestRefresh(unittest.TestCase):
+    # def refresh(self):
+    # def follow(self, interval=1.0):
+    def setUp(self):
+        with open(TESTFILE, 'w') as handle:
+            handle.write('one\ntwo\n')
+
+    def append(self, text):
+        with open(TESTFILE, 'a') as handle:
+            handle.write(text)
+
+    def test_refresh_appended(self):
+        """ Only appended lines are read and the file is still known to match contents. """
+        test_file = FileAsObj(TESTFILE)
+        self.assertEqual(test_file.refresh(), [])
+        self.append('three\nfour\n')
+        self.assertEqual(test_file.refresh(), ['three', 'four'])
+        self.assertEqual(test_file.contents, ['one', 'two', 'three', 'four'])
+        self.assertFalse(test_file.changed)
+        self.assertTrue(test_file.add('five'))
+        self.assertTrue(test_file._appendable())
+
+    def test_refresh_partial_line(self):
+        """ A line still being written is replaced once it is complete. """
+        self.append('thr')
+        test_file = FileAsObj(TESTFILE)
+        self.assertEqual(test_file.contents, ['one', 'two', 'thr'])
+        self.append('ee\nfo')
+        self.assertEqual(test_file.refresh(), ['three', 'fo'])
+        self.append('ur\n')
+        self.assertEqual(test_file.refresh(), ['four'])
+        self.assertEqual(test_file.contents, ['one', 'two', 'three', 'four'])
+
+    def test_refresh_journal_bounded(self):
+        """ Reading new data again and again, or many updates, does not grow the journal without bound. """
+        test_file = FileAsObj(TESTFILE)
+        test_file.add('three')
+        for number in range(50):
+            self.append('line{0}\npart'.format(number))
+            test_file.refresh()
+        self.assertEqual(test_file._journal, [('read', TESTFILE)])
+        test_file._journal_limit = 10
+        for number in range(20):
+            test_file.add('more{0}'.format(number))
+        self.assertEqual(list(test_file._journal), [('set', None)])
+        self.assertTrue(test_file.save())
+        self.assertEqual(FileAsObj(TESTFILE).contents, test_file.contents)
+
+    def test_refresh_rotated(self):
+        """ A truncated or replaced file is read again from the start. """
+        test_file = FileAsObj(TESTFILE)
+        with open(TESTFILE, 'w') as handle:
+            handle.write('new\n')
+        self.assertEqual(test_file.refresh(), ['new'])
+        os.rename(TESTFILE, TESTFILE + '.1')
+        with open(TESTFILE, 'w') as handle:
+            handle.write('rotated\nfile\nwith more lines\n')
+        self.assertEqual(test_file.refresh(), ['rotated', 'file', 'with more lines'])
+        self.assertEqual(test_file.contents, ['rotated', 'file', 'with more lines'])
+        os.unlink(TESTFILE + '.1')
+
+    def test_refresh_unique_sorted(self):
+        """ New lines follow unique and sorted. """
+        test_file = FileAsObj()
+        test_file.unique = True
+        test_file.sorted = True
+        test_file.read(TESTFILE)
+        self.append('alpha\ntwo\nzulu\n')
+        self.assertEqual(test_file.refresh(), ['alpha', 'two', 'zulu'])
+        self.assertEqual(test_file.contents, ['alpha', 'one', 'two', 'zulu'])
+        self.append('bravo')
+        test_file.refresh()
+        self.append('\n')
+        test_file.refresh()
+        self.assertEqual(test_file.contents, ['alpha', 'bravo', 'one', 'two', 'zulu'])
+
+    def test_follow(self):
+        """ follow() yields only lines appended after it starts. """
+        test_file = FileAsObj(TESTFILE)
+        lines = test_file.follow(interval=0.01)
+        self.append('three\n')
+        self.assertEqual(next(lines), 'three')
+        self.append('four\nfive\n')
+        self.assertEqual([next(lines), next(lines)], ['four', 'five'])
+
+
+class TestLazy(unittest.TestCase):
+    # def __init__(self, filename=None, logging=True, log_size=None, lazy=False):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS)
+        test_file.save()
+
+    def test_lazy_not_found(self):
+        """ Missing files still fail up front. """
+        with self.assertRaises(IOError):
+            FileAsObj('/this/file/does/not/exist/', lazy=True)
+
+    def test_lazy_streams(self):
+        """ Reads go to disk without building contents. """
+        test_file = FileAsObj(TESTFILE, lazy=True)
+        eager_file = FileAsObj(TESTFILE)
+        self.assertIsNone(test_file._contents)
+        self.assertEqual(len(test_file), len(eager_file))
+        self.assertEqual(list(test_file), eager_file.contents)
+        self.assertEqual(test_file.grep('www01'), eager_file.grep('www01'))
+        self.assertEqual(test_file.egrep('^10.*'), eager_file.egrep('^10.*'))
+        self.assertEqual(test_file.check('#comment'), '#comment')
+        self.assertFalse(test_file.check('not in file'))
+        self.assertTrue('#comment' in test_file)
+        self.assertIsNone(test_file._contents)
+
+    def test_lazy_loads_on_update(self):
+        """ Updating a lazy file loads it first. """
+        test_file = FileAsObj(TESTFILE, lazy=True)
+        self.assertTrue(test_file.add('lazy line'))
+        self.assertIsNotNone(test_file._contents)
+        self.assertEqual(test_file.contents[-1], 'lazy line')
+        self.assertEqual(len(test_file), len(TESTCONTENTS.split('\n')) + 1)
+
+    def test_lazy_len_without_final_line_ending(self):
+        """ A last line without a line ending is still counted. """
+        with open(TESTFILE, 'w') as handle:
+            handle.write('a\n\nb')
+        test_file = FileAsObj(TESTFILE, lazy=True)
+        self.assertEqual(len(test_file), 3)
+        self.assertEqual(list(test_file), ['a', '', 'b'])
+
+
+class TestCompact(unittest.TestCase):
+    # class CompactLines(Sequence):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS)
+        test_file.save()
+
+    def test_compact_lines(self):
+        """ CompactLines behaves like a read-only list. """
+        lines = ['a', '', 'bcd', 'a']
+        compact = CompactLines(lines)
+        self.assertEqual(compact, lines)
+        self.assertEqual(len(compact), 4)
+        self.assertEqual(compact[2], 'bcd')
+        self.assertEqual(compact[-1], 'a')
+        self.assertEqual(compact[1:3], ['', 'bcd'])
+        self.assertEqual(compact[::2], ['a', 'bcd'])
+        self.assertEqual(list(compact), lines)
+        self.assertTrue('' in compact)
+        self.assertTrue('bcd' in compact)
+        self.assertFalse('bc' in compact)
+        self.assertEqual(compact.grep('a'), ['a', 'a'])
+        self.assertEqual(CompactLines.from_text('a\n\nbcd\na\n'), lines)
+        self.assertEqual(CompactLines.from_text('a\n\nbcd\na'), lines)
+        self.assertEqual(CompactLines.from_text(''), [])
+        self.assertEqual(CompactLines.from_text('\n'), [''])
+        with self.assertRaises(IndexError):
+            compact[4]
+
+    def test_compact_file(self):
+        """ A compact file answers like a normal one. """
+        test_file = FileAsObj(TESTFILE, compact=True)
+        eager_file = FileAsObj(TESTFILE)
+        self.assertIsInstance(test_file.contents, CompactLines)
+        self.assertEqual(test_file.contents, eager_file.contents)
+        self.assertEqual(len(test_file), len(eager_file))
+        self.assertEqual(str(test_file), str(eager_file))
+        self.assertEqual(list(test_file), eager_file.contents)
+        self.assertEqual(test_file.grep('www01'), eager_file.grep('www01'))
+        self.assertEqual(test_file.grep('#'), eager_file.grep('#'))
+        self.assertEqual(test_file.egrep('^10.*'), eager_file.egrep('^10.*'))
+        self.assertEqual(test_file.check('#comment'), '#comment')
+        self.assertFalse(test_file.check('#comm'))
+
+    def test_compact_update(self):
+        """ Update methods unpack compact storage into a list first, but only when they change something. """
+        test_file = FileAsObj(TESTFILE, compact=True)
+        test_file.unique = True
+        self.assertFalse(test_file.rm('missing'))
+        self.assertFalse(test_file.replace(['missing', '#comment'], '#comment'))
+        self.assertFalse(test_file.add('#comment'))
+        self.assertIsInstance(test_file.contents, CompactLines)
+        self.assertFalse(test_file.changed)
+        self.assertTrue(test_file.rm('#comment'))
+        self.assertIsInstance(test_file.contents, list)
+        self.assertFalse(test_file.check('#comment'))
+        self.assertTrue(test_file.save())
+        expected = [this for this in TESTCONTENTS.split('\n') if this != '#comment']
+        self.assertEqual(FileAsObj(TESTFILE).contents, expected)
+
+    def test_compact_write(self):
+        """ Writing compact contents reproduces the file. """
+        test_file = FileAsObj(TESTFILE, compact=True)
+        test_file.linesep = '\n'
+        test_file._synced = None  # Force a full rewrite.
+        self.assertTrue(test_file.write())
+        self.assertEqual(FileAsObj(TESTFILE).contents, TESTCONTENTS.split('\n'))
+
+    def test_compact_memory(self):
+        """ Compact storage is several times smaller than a list of strings. """
+        lines = ['10.0.{0}.{1} host{2}.example.com'.format(this % 250, this % 7, this) for this in range(10000)]
+        as_list = sys.getsizeof(lines) + sum(sys.getsizeof(this) for this in lines)
+        self.assertLess(sys.getsizeof(CompactLines(lines)) * 2, as_list)
+        lines = ['{0}.example.net'.format(this) for this in range(10000)]
+        as_list = sys.getsizeof(lines) + sum(sys.getsizeof(this) for this in lines)
+        self.assertLess(sys.getsizeof(CompactLines(lines)) * 3, as_list)
+
+
+class TestBinary(unittest.TestCase):
+    # self.binary = binary
+    def setUp(self):
+        with open(TESTFILE, 'wb') as handle:
+            handle.write(b'10.0.0.1 web01\n\xff\xfe not utf-8\n10.0.0.2 web02\r\n')
+
+    def test_binary_read(self):
+        """ Lines are bytes with line endings removed, undecodable bytes included. """
+        test_file = FileAsObj(TESTFILE, binary=True)
+        self.assertEqual(test_file.contents, [b'10.0.0.1 web01', b'\xff\xfe not utf-8', b'10.0.0.2 web02'])
+        self.assertEqual(test_file.linesep, b'\n')
+        self.assertEqual(bytes(test_file), b'10.0.0.1 web01\n\xff\xfe not utf-8\n10.0.0.2 web02')
+        self.assertIn('not utf-8', str(test_file))
+        self.assertEqual(FileAsObj(TESTFILE, binary=True, compact=True).contents, test_file.contents)
+        self.assertEqual(list(FileAsObj(TESTFILE, binary=True, lazy=True)), test_file.contents)
+
+    def test_binary_search(self):
+        """ Searches take bytes needles and patterns. """
+        for test_file in (FileAsObj(TESTFILE, binary=True), FileAsObj(TESTFILE, binary=True, lazy=True),
+                          FileAsObj(TESTFILE, binary=True, compact=True)):
+            self.assertEqual(test_file.grep(b'web'), [b'10.0.0.1 web01', b'10.0.0.2 web02'])
+            self.assertEqual(test_file.egrep(b'^\xff'), [b'\xff\xfe not utf-8'])
+            self.assertEqual(test_file.egrep_many([b'web02$', b'\xfe']),
+                             [(b'\xff\xfe not utf-8', b'\xfe'), (b'10.0.0.2 web02', b'web02$')])
+            self.assertEqual(test_file.grep_any([b'web02', b'\xfe']), [b'\xff\xfe not utf-8', b'10.0.0.2 web02'])
+            self.assertEqual(test_file.check(b'10.0.0.1 web01'), b'10.0.0.1 web01')
+            with self.assertRaises(TypeError):
+                test_file.check('10.0.0.1 web01')
+
+    def test_binary_update(self):
+        """ Updates take bytes and write() emits bytes. """
+        test_file = FileAsObj(TESTFILE, binary=True)
+        self.assertTrue(test_file.add(b'10.0.0.3 web03\n10.0.0.4 web04'))
+        self.assertTrue(test_file.rm(b'10.0.0.1 web01'))
+        self.assertTrue(test_file.replace(b'\xff\xfe not utf-8', b'\xfe'))
+        with self.assertRaises(TypeError):
+            test_file.add('text')
+        with self.assertRaises(TypeError):
+            test_file.replace(b'\xfe', 'text')
+        self.assertTrue(test_file.write())
+        with open(TESTFILE, 'rb') as handle:
+            self.assertEqual(handle.read(), b'\xfe\n10.0.0.2 web02\n10.0.0.3 web03\n10.0.0.4 web04\n')
+
+    def test_binary_append_write(self):
+        """ A file ending every line with linesep is appended to rather than rewritten. """
+        with open(TESTFILE, 'wb') as handle:
+            handle.write(b'\xff one\n')
+        test_file = FileAsObj(TESTFILE, binary=True)
+        self.assertTrue(test_file.add(b'\xff two'))
+        self.assertTrue(test_file._appendable())
+        self.assertTrue(test_file.write())
+        self.assertEqual(FileAsObj(TESTFILE, binary=True).contents, [b'\xff one', b'\xff two'])
+
+
 class TestCheck(unittest.TestCase):
     # def check(self, line):
     def test_check_present(self):
@@ -207,6 +584,112 @@ class TestCheck(unittest.TestCase):
             test_file.check(False)
 
 
+class TestLineIndex(unittest.TestCase):
+    # def _line_index(self):
+    def test_index_follows_updates(self):
+        """ Membership must track add(), rm() and replace(). """
+        test_file = FileAsObj()
+        test_file.add(['a', 'b', 'a'])
+        self.assertEqual(test_file.check('a'), 'a')
+        self.assertTrue(test_file.rm('a'))
+        self.assertFalse(test_file.check('a'))
+        self.assertTrue(test_file.replace('b', 'c'))
+        self.assertFalse(test_file.check('b'))
+        self.assertEqual(test_file.check('c'), 'c')
+        self.assertEqual(test_file.contents, ['c'])
+
+    def test_index_follows_contents_assignment(self):
+        """ Replacing contents, even with a list of the same length, must not leave a stale index. """
+        test_file = FileAsObj()
+        test_file.add(['a', 'b'])
+        self.assertTrue('a' in test_file)
+        test_file.contents = ['c', 'd']
+        self.assertFalse('a' in test_file)
+        self.assertTrue('c' in test_file)
+
+    def test_index_follows_in_place_append(self):
+        """ Lines appended directly to contents are still found. """
+        test_file = FileAsObj()
+        test_file.add('a')
+        self.assertFalse(test_file.check('b'))
+        test_file.contents.append('b')
+        self.assertEqual(test_file.check('b'), 'b')
+
+    def test_index_follows_in_place_edit(self):
+        """ Lines changed directly in contents, keeping its length, are noticed by every index. """
+        test_file = FileAsObj()
+        test_file.prefix_index = True
+        test_file.grep_index = True
+        test_file.add(['a111', 'b222', 'c333'])
+        test_file.create_index('letter', lambda line: line[0])
+        self.assertTrue(test_file.check('a111') and test_file.startswith('a') and test_file.grep('a111'))
+        self.assertTrue(test_file.lookup('letter', 'a'))
+        test_file.contents[0] = 'z999'
+        self.assertFalse(test_file.check('a111'))
+        self.assertEqual(test_file.check('z999'), 'z999')
+        self.assertFalse(test_file.startswith('a'))
+        self.assertFalse(test_file.grep('a111'))
+        self.assertEqual(test_file.lookup('letter', 'z'), ['z999'])
+        self.assertIsInstance(FileAsObj().contents, list)
+
+    def test_positions_built_on_demand(self):
+        """ The first check() scans, the second builds the membership index; positions wait for an update. """
+        test_file = FileAsObj()
+        test_file.contents = ['a', 'b', 'a', 'c']
+        self.assertEqual(test_file.check('c'), 'c')
+        self.assertIsNone(test_file._index)
+        self.assertFalse(test_file.check('d'))
+        self.assertIsNotNone(test_file._index)
+        self.assertIsNone(test_file._places)
+        test_file.add('b')
+        self.assertTrue(test_file.replace('b', 'z'))
+        self.assertEqual(test_file.contents, ['a', 'z', 'a', 'c', 'z'])
+        self.assertEqual(test_file._positions('a'), [0, 2])
+        self.assertTrue(test_file.replace('a', 'z'))
+        self.assertEqual(test_file._positions('z'), [0, 1, 2, 4])
+        self.assertEqual(test_file.contents, ['z', 'z', 'z', 'c', 'z'])
+
+    def test_index_follows_sort(self):
+        """ Positions must be refreshed after sorting so later updates hit the right lines. """
+        test_file = FileAsObj()
+        test_file.add(['c', 'a', 'b', 'a'])
+        test_file.sort()
+        self.assertTrue(test_file.replace('a', 'z'))
+        self.assertEqual(test_file.contents, ['z', 'z', 'b', 'c'])
+
+    def test_bulk_rm_and_replace(self):
+        """ Bulk updates over many duplicate lines keep order and positions intact. """
+        test_file = FileAsObj()
+        test_file.add([str(this % 100) for this in range(100000)])
+        self.assertTrue(test_file.rm([str(this) for this in range(0, 100, 2)]))
+        self.assertEqual(len(test_file), 50000)
+        self.assertEqual(test_file.contents[:3], ['1', '3', '5'])
+        self.assertTrue(test_file.replace(['1', '3'], '5'))
+        self.assertEqual(test_file.contents[:4], ['5', '5', '5', '7'])
+        self.assertTrue(test_file.rm('5'))
+        self.assertEqual(test_file.contents[:2], ['7', '9'])
+        self.assertFalse(test_file.check('5'))
+
+    def test_replace_with_itself(self):
+        """ Replacing a line with itself changes nothing. """
+        test_file = FileAsObj()
+        test_file.add(['a', 'b'])
+        self.assertFalse(test_file.replace('a', 'a'))
+        self.assertEqual(test_file.contents, ['a', 'b'])
+
+    def test_unique_large_read(self):
+        """ Reading many lines with unique must keep first occurrences in order. """
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.contents = [str(this % 50000) for this in range(100000)]
+        self.assertTrue(test_file.save())
+        test_file = FileAsObj()
+        test_file.unique = True
+        test_file.read(TESTFILE)
+        self.assertEqual(test_file.contents, [str(this) for this in range(50000)])
+        self.assertFalse(test_file.add('49999'))
+
+
 class TestAdd(unittest.TestCase):
     # def add(self, line):
     def test_add_failure_param(self):
@@ -274,6 +757,16 @@ class TestRm(unittest.TestCase):
         with self.assertRaises(TypeError):
             test_file.rm(True)
 
+    def test_rm_single_pass(self):
+        """ rm() counts what it removed without building the position map. """
+        test_file = FileAsObj()
+        test_file.contents = ['a', 'b', 'a', 'c']
+        self.assertTrue(test_file.rm(['a', 'x', 'a']))
+        self.assertEqual(test_file.contents, ['b', 'c'])
+        self.assertIsNone(test_file._places)
+        self.assertIn('Removed 2 occurrence(s) of "a"', str(test_file.log))
+        self.assertIn('"x" not in None', str(test_file.log))
+
     def test_remove_multi(self):
         """ Test deleting multiple lines. """
         test_file = FileAsObj()
@@ -298,6 +791,220 @@ class TestWrite(unittest.TestCase):
         self.assertTrue(test_file.write())
 
 
+class TestAtomicWrite(unittest.TestCase):
+    # def write(self):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS)
+        test_file.save()
+
+    def test_write_replaces_file(self):
+        """ Writing swaps in a new file, keeps its permissions and leaves no temporary files behind. """
+        os.chmod(TESTFILE, 0o640)
+        before = os.stat(TESTFILE).st_ino
+        test_file = FileAsObj(TESTFILE)
+        test_file.replace('#comment', 'atomic')
+        self.assertTrue(test_file.write())
+        self.assertFalse(test_file.changed)
+        self.assertNotEqual(os.stat(TESTFILE).st_ino, before)
+        self.assertEqual(os.stat(TESTFILE).st_mode & 0o777, 0o640)
+        self.assertEqual(FileAsObj(TESTFILE).check('atomic'), 'atomic')
+        directory, name = os.path.split(TESTFILE)
+        self.assertFalse([this for this in os.listdir(directory) if this.startswith('.' + name)])
+
+    def test_write_in_place(self):
+        """ With atomic off the file keeps its inode. """
+        before = os.stat(TESTFILE).st_ino
+        test_file = FileAsObj(TESTFILE)
+        test_file.atomic = False
+        test_file.replace('#comment', 'in place')
+        self.assertTrue(test_file.write())
+        self.assertEqual(os.stat(TESTFILE).st_ino, before)
+        self.assertEqual(FileAsObj(TESTFILE).check('in place'), 'in place')
+
+    def test_write_without_temp_file(self):
+        """ If no temporary file can be made beside it, as in a read-only directory, the file is rewritten in place. """
+        def refuse(target, mode='w'):
+            raise OSError(errno.EACCES, 'Permission denied', target)
+        before = os.stat(TESTFILE).st_ino
+        test_file = FileAsObj(TESTFILE)
+        test_file._temp_file = refuse
+        test_file.replace('#comment', 'no temp')
+        self.assertTrue(test_file.write())
+        self.assertFalse(test_file.changed)
+        self.assertEqual(os.stat(TESTFILE).st_ino, before)
+        self.assertEqual(FileAsObj(TESTFILE).check('no temp'), 'no temp')
+
+    def test_write_through_symlink(self):
+        """ Writing through a symlink updates the file it points to. """
+        link = TESTFILE + '.link'
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(TESTFILE, link)
+        try:
+            test_file = FileAsObj(link)
+            test_file.add('via link')
+            self.assertTrue(test_file.write())
+            self.assertTrue(os.path.islink(link))
+            self.assertEqual(FileAsObj(TESTFILE).contents[-1], 'via link')
+        finally:
+            os.unlink(link)
+
+    def test_write_linesep_and_fsync(self):
+        """ linesep ends every line and fsync does not change the result. """
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.fsync = True
+        test_file.linesep = '\r\n'
+        test_file.add(['a', 'b'])
+        self.assertTrue(test_file.write())
+        with open(TESTFILE, 'rb') as handle:
+            self.assertEqual(handle.read(), b'a\r\nb\r\n')
+
+
+class TestLocking(unittest.TestCase):
+    # def transaction(self):
+    def setUp(self):
+        with open(TESTFILE, 'w') as handle:
+            handle.write('one\ntwo\n')
+
+    def test_locked_read_write(self):
+        """ Locking reads and writes work, including writes nested in a transaction. """
+        test_file = FileAsObj(TESTFILE, locking=True)
+        self.assertEqual(test_file.contents, ['one', 'two'])
+        self.assertTrue(test_file.add('three'))
+        self.assertTrue(test_file.save())
+        with test_file.transaction():
+            test_file.rm('one')
+        self.assertEqual(FileAsObj(TESTFILE, locking=True).contents, ['two', 'three'])
+        self.assertFalse(test_file._lock_held)
+
+    def test_transaction_merges(self):
+        """ Changes saved by another writer are kept and ours are replayed on top. """
+        first = FileAsObj(TESTFILE)
+        second = FileAsObj(TESTFILE)
+        second.unique = True
+        first.add('three')
+        first.rm('one')
+        first.save()
+        second.add(['four', 'three'])
+        second.replace('two', 'deux')
+        with second.transaction():
+            second.add('five')
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['deux', 'three', 'four', 'five'])
+        self.assertFalse(second.changed)
+
+    def test_transaction_error(self):
+        """ Nothing is written if the block raises. """
+        test_file = FileAsObj(TESTFILE)
+        with self.assertRaises(ValueError):
+            with test_file.transaction():
+                test_file.add('three')
+                raise ValueError('abort')
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['one', 'two'])
+
+    def test_concurrent_writers(self):
+        """ Writers in transactions never lose each other's lines. """
+        def writer(name):
+            test_file = FileAsObj(TESTFILE)
+            for number in range(20):
+                with test_file.transaction():
+                    test_file.add('{0} {1}'.format(name, number))
+        threads = [threading.Thread(target=writer, args=(name,)) for name in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        contents = FileAsObj(TESTFILE).contents
+        self.assertEqual(len(contents), 82)
+        self.assertEqual(len(set(contents)), 82)
+
+
+class TestAppendOnlyWrite(unittest.TestCase):
+    # def _appendable(self):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(['one', 'two'])
+        test_file.save()
+
+    def test_append_only(self):
+        """ Only appended lines are written, the file keeps its inode. """
+        before = os.stat(TESTFILE).st_ino
+        test_file = FileAsObj(TESTFILE)
+        self.assertTrue(test_file._appendable())
+        test_file.add(['three', 'four'])
+        self.assertTrue(test_file._appendable())
+        self.assertTrue(test_file.save())
+        self.assertEqual(os.stat(TESTFILE).st_ino, before)
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['one', 'two', 'three', 'four'])
+        test_file.add('five')
+        self.assertTrue(test_file.save())
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['one', 'two', 'three', 'four', 'five'])
+
+    def test_edits_rewrite(self):
+        """ Any change other than appending falls back to a full rewrite. """
+        test_file = FileAsObj(TESTFILE)
+        test_file.add('three')
+        test_file.rm('one')
+        self.assertFalse(test_file._appendable())
+        self.assertTrue(test_file.save())
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['two', 'three'])
+        self.assertTrue(test_file._appendable())
+
+    def test_direct_edits_rewrite(self):
+        """ Editing contents directly, even before an add(), is written in full rather than appended. """
+        edits = [
+            (lambda contents: contents.__setitem__(0, 'Z'), ['Z', 'two']),
+            (lambda contents: contents.sort(reverse=True), ['two', 'one']),
+            (lambda contents: contents.insert(0, 'Z'), ['Z', 'one', 'two']),
+        ]
+        for edit, expected in edits:
+            self.setUp()
+            test_file = FileAsObj(TESTFILE)
+            edit(test_file.contents)
+            self.assertFalse(test_file._appendable())
+            self.assertTrue(test_file.save())
+            self.assertEqual(FileAsObj(TESTFILE).contents, expected)
+            edit(test_file.contents)
+            test_file.add('three')
+            self.assertFalse(test_file._appendable())
+            self.assertTrue(test_file.save())
+            self.assertEqual(FileAsObj(TESTFILE).contents, list(test_file.contents))
+
+    def test_file_changed_on_disk(self):
+        """ A file modified by someone else since read() is rewritten, not appended to. """
+        test_file = FileAsObj(TESTFILE)
+        test_file.add('three')
+        with open(TESTFILE, 'a') as handle:
+            handle.write('intruder\n')
+        self.assertFalse(test_file._appendable())
+        self.assertTrue(test_file.save())
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['one', 'two', 'three'])
+
+    def test_missing_final_line_ending(self):
+        """ A file whose last line has no line ending is rewritten so lines are not glued together. """
+        with open(TESTFILE, 'w') as handle:
+            handle.write('one\ntwo')
+        test_file = FileAsObj(TESTFILE)
+        test_file.add('three')
+        self.assertFalse(test_file._appendable())
+        self.assertTrue(test_file.save())
+        self.assertEqual(FileAsObj(TESTFILE).contents, ['one', 'two', 'three'])
+
+    def test_other_line_endings(self):
+        """ A file using a different line ending than self.linesep is rewritten. """
+        with open(TESTFILE, 'wb') as handle:
+            handle.write(b'one\r\ntwo\r\n')
+        test_file = FileAsObj(TESTFILE)
+        test_file.add('three')
+        self.assertFalse(test_file._appendable())
+        self.assertTrue(test_file.save())
+        with open(TESTFILE, 'rb') as handle:
+            self.assertEqual(handle.read(), b'one\ntwo\nthree\n')
+
+
 class TestSave(unittest.TestCase):
     # def save(self):
     def test_save_no_changes(self):
@@ -343,6 +1050,50 @@ class TestGrep(unittest.TestCase):
         self.assertTrue(result == ['10.2.5.2    www01   www01.example.tld', '#172.8.8.8    www01   www01.example.tld'])
 
 
+class TestGrepMany(unittest.TestCase):
+    # def grep_any(self, needles):
+    # def grep_all(self, needles):
+    # def grep_which(self, needles):
+    def test_automaton_overlaps(self):
+        """ Needles that overlap or nest inside each other are all found. """
+        automaton = Automaton(['he', 'she', 'his', 'hers', 'e'])
+        self.assertEqual(automaton.search('ushers'), set([0, 1, 3, 4]))
+        self.assertEqual(automaton.search('xyz'), set())
+        self.assertTrue(automaton.first('this'))
+        self.assertFalse(automaton.first('xyz'))
+
+    def test_grep_any(self):
+        """ Few and many needles agree with one grep() per needle. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS)
+        needles = ['www01', 'localhost', 'not present']
+        expected = [line for line in test_file if any(needle in line for needle in needles)]
+        self.assertEqual(test_file.grep_any(needles), expected)
+        many = needles + ['missing{0}'.format(this) for this in range(20)]
+        self.assertEqual(test_file.grep_any(many), expected)
+        self.assertFalse(test_file.grep_any(['missing{0}'.format(this) for this in range(20)]))
+        with self.assertRaises(TypeError):
+            test_file.grep_any(1)
+
+    def test_grep_all(self):
+        """ Only lines containing every needle match. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS)
+        self.assertEqual(test_file.grep_all(['www01', '#']), ['#172.8.8.8    www01   www01.example.tld'])
+        many = ['1', '0', '.', '3.4', 'mail01', 'mail', 'ma', 'il', 'tld', 'example']
+        self.assertEqual(test_file.grep_all(many), ['10.2.3.4    mail01 mail01.example.tld'])
+        self.assertFalse(test_file.grep_all(many + ['not present']))
+
+    def test_grep_which(self):
+        """ Each match reports the needles it contained. """
+        test_file = FileAsObj()
+        test_file.add(['alpha beta', 'gamma', 'beta'])
+        self.assertEqual(test_file.grep_which(['beta', 'alpha']),
+                         [('alpha beta', ['beta', 'alpha']), ('beta', ['beta'])])
+        many = ['beta', 'alpha'] + ['missing{0}'.format(this) for this in range(20)]
+        self.assertEqual(test_file.grep_which(many), [('alpha beta', ['beta', 'alpha']), ('beta', ['beta'])])
+
+
 class TestEgrep(unittest.TestCase):
     # def egrep(self, pattern):
     def test_egrep_char_list(self):
@@ -418,6 +1169,92 @@ class TestEgrep(unittest.TestCase):
         self.assertIsInstance(result, bool)
 
 
+class TestParallel(unittest.TestCase):
+    # def _parallel(self, workers, needle, pattern, flags):
+    def test_parallel_contents(self):
+        """ Searches split across processes return the same lines in the same order. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS.split('\n') * 50)
+        test_file.parallel_lines = 10
+        self.assertIsNone(test_file._parallel(3, 'www01', None, 0))  # Substrings in memory are searched here.
+        self.assertEqual(test_file.grep('www01', workers=3), test_file.grep('www01'))
+        self.assertEqual(test_file.egrep('^10.*', workers=4), test_file.egrep('^10.*'))
+        self.assertFalse(test_file.grep('not present', workers=2))
+
+    def test_parallel_lazy_file(self):
+        """ A lazy file is split at line endings and searched straight from disk. """
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS.split('\n') * 50)
+        test_file.save()
+        test_file = FileAsObj(TESTFILE, lazy=True)
+        test_file.parallel_bytes = 1
+        self.assertEqual(test_file.grep('www01', workers=7), FileAsObj(TESTFILE).grep('www01'))
+        self.assertEqual(test_file.egrep('h[o0]stname', workers=5), FileAsObj(TESTFILE).egrep('h[o0]stname'))
+        self.assertIsNone(test_file._contents)
+
+    def test_small_stays_serial(self):
+        """ Below the threshold no pool is started. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS)
+        self.assertIsNone(test_file._parallel(4, 'www01', None, 0))
+        self.assertTrue(test_file.grep('www01', workers=4))
+
+
+class TestEgrepCache(unittest.TestCase):
+    # class PatternCache(object):
+    # def egrep_many(self, patterns, flags=0):
+    def test_cache_hits(self):
+        """ Repeated patterns come from the cache. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS)
+        test_file.patterns.clear()
+        self.assertTrue(test_file.egrep('^10.*'))
+        self.assertTrue(test_file.egrep('^10.*'))
+        self.assertEqual(test_file.patterns.stats()['misses'], 1)
+        self.assertEqual(test_file.patterns.stats()['hits'], 1)
+
+    def test_cache_size(self):
+        """ The least recently used pattern is dropped when the cache is full. """
+        cache = FileAsObj.patterns.__class__(size=2)
+        cache.compile('a')
+        cache.compile('b')
+        cache.compile('a')
+        cache.compile('c')
+        self.assertEqual(cache.stats()['entries'], 2)
+        cache.compile('a')
+        self.assertEqual(cache.hits, 2)
+        cache.compile('b')
+        self.assertEqual(cache.misses, 4)
+
+    def test_compiled_pattern_and_flags(self):
+        """ egrep() accepts compiled patterns and flags. """
+        test_file = FileAsObj()
+        test_file.add(TESTCONTENTS)
+        self.assertEqual(test_file.egrep(re.compile('FREEBIRD', re.IGNORECASE)), test_file.egrep('freebird'))
+        self.assertEqual(test_file.egrep('FREEBIRD', re.IGNORECASE), test_file.egrep('freebird'))
+        with self.assertRaises(ValueError):
+            test_file.egrep(re.compile('x'), re.IGNORECASE)
+
+    def test_egrep_many(self):
+        """ Each matching line is reported with the pattern that matched first. """
+        test_file = FileAsObj()
+        test_file.add(['10.0.0.1 mail', 'mail only', 'nothing', '10.0.0.2'])
+        expected = [('10.0.0.1 mail', '^10\\.'), ('mail only', 'mail'), ('10.0.0.2', '^10\\.')]
+        self.assertEqual(test_file.egrep_many(['mail', '^10\\.']), expected)
+        compiled = re.compile('mail')
+        self.assertEqual(test_file.egrep_many([compiled, '^10\\.'])[1], ('mail only', compiled))
+        expected = [('10.0.0.1 mail', '^10\\.'), ('10.0.0.2', '^10\\.')]
+        self.assertEqual(test_file.egrep_many(['(a)i\\1', '^10\\.']), expected)
+        self.assertFalse(test_file.egrep_many(['^x', 'z$']))
+        test_file.add(['ABC', 'xyz', 'XYZ'])  # Inline flags and conditional groups keep their meaning.
+        self.assertEqual(test_file.egrep_many(['(?i)abc', 'XYZ'])[-2:], [('ABC', '(?i)abc'), ('XYZ', 'XYZ')])
+        self.assertEqual(test_file.egrep_many(['(x)?(?(1)yz|ABC)', '(m)ail'])[-2:],
+                         [('ABC', '(x)?(?(1)yz|ABC)'), ('xyz', '(x)?(?(1)yz|ABC)')])
+        with self.assertRaises(TypeError):
+            test_file.egrep_many('mail')
+
+
 class TestReplace(unittest.TestCase):
     # def replace(self, old, new):
     def test_replace_regex(self):
@@ -429,6 +1266,18 @@ class TestReplace(unittest.TestCase):
         self.assertTrue(test_file.replace(old, new))
         self.assertFalse(test_file.egrep('^[ ]+#.*'))
 
+    def test_replace_after_in_place_reorder(self):
+        """ Positions known before contents were reordered in place are not trusted. """
+        for reorder in (lambda lines: lines.reverse(), lambda lines: lines.sort(reverse=True),
+                        lambda lines: lines.__setitem__(slice(None), ['c', 'b', 'a'])):
+            test_file = FileAsObj()
+            test_file.contents = ['a', 'b', 'c']
+            test_file.check('a')
+            self.assertEqual(test_file.check('a'), 'a')
+            reorder(test_file.contents)
+            self.assertTrue(test_file.replace('a', 'X'))
+            self.assertEqual(test_file.contents, ['c', 'b', 'X'])
+
     def test_replace_list(self):
         """ Test substitute lines using a list of strings. """
         test_file = FileAsObj()
@@ -541,6 +1390,44 @@ class TestSort(unittest.TestCase):
         self.assertIsNone(test_file.sort())
         self.assertTrue(test_file.contents == ['1', '2', '3'])
 
+    def test_sorted_insert_keeps_key_and_reverse(self):
+        """ Lines added while sorted land where a full sort() with the same key/reverse would put them. """
+        test_file = FileAsObj()
+        test_file.sorted = True
+        test_file.add(['bb', 'a', 'dddd'])
+        test_file.sort(key=len, reverse=True)
+        for this in ['ccc', 'e', 'ff', 'g', 'hhhhh']:
+            self.assertTrue(test_file.add(this))
+        expected = sorted(['bb', 'a', 'dddd', 'ccc', 'e', 'ff', 'g', 'hhhhh'], key=len, reverse=True)
+        self.assertEqual(test_file.contents, expected)
+
+    def test_sorted_matches_full_sort(self):
+        """ Incremental add()/rm() must agree with re-sorting from scratch. """
+        test_file = FileAsObj()
+        test_file.sorted = True
+        expected = []
+        for this in range(500):
+            line = str((this * 7919) % 211)
+            test_file.add(line)
+            expected.append(line)
+        self.assertEqual(test_file.contents, sorted(expected))
+        self.assertTrue(test_file.rm(['5', '17', '200']))
+        self.assertFalse(test_file.rm('5'))
+        expected = [this for this in expected if this not in ('5', '17', '200')]
+        self.assertEqual(test_file.contents, sorted(expected))
+
+    def test_sorted_unique_and_check(self):
+        """ unique and check() use binary search while sorted. """
+        test_file = FileAsObj()
+        test_file.sorted = True
+        test_file.unique = True
+        self.assertTrue(test_file.add(['b', 'c', 'a']))
+        self.assertFalse(test_file.add('b'))
+        self.assertTrue(test_file.add('ab'))
+        self.assertEqual(test_file.contents, ['a', 'ab', 'b', 'c'])
+        self.assertEqual(test_file.check('ab'), 'ab')
+        self.assertFalse(test_file.check('bb'))
+
 
 class TestLen(unittest.TestCase):
     # def __len__(self):
@@ -680,5 +1567,396 @@ class TestIter(unittest.TestCase):
             self.assertIsInstance(this, str)
 
 
+
+class TestFileAsObjSet(unittest.TestCase):
+    # class FileAsObjSet(object):
+    def setUp(self):
+        self.names = ['{0}.{1}'.format(TESTFILE, this) for this in range(5)]
+        for number, name in enumerate(self.names):
+            test_file = FileAsObj()
+            test_file.filename = name
+            test_file.add(['common', 'only in {0}'.format(number)])
+            test_file.save()
+
+    def tearDown(self):
+        for name in self.names:
+            os.unlink(name)
+
+    def test_read_and_search(self):
+        """ All files load in order and searches report which file matched. """
+        test_set = FileAsObjSet(self.names)
+        self.assertEqual(len(test_set), 5)
+        self.assertEqual([member.filename for member in test_set], self.names)
+        self.assertEqual(test_set.grep('only in 3'), [(self.names[3], 'only in 3')])
+        self.assertEqual(len(test_set.check('common')), 5)
+        self.assertEqual(test_set.egrep('^only in [12]$'), [(self.names[1], 'only in 1'), (self.names[2], 'only in 2')])
+        self.assertFalse(test_set.grep('not present'))
+        self.assertTrue(self.names[0] in test_set)
+
+    def test_missing_file(self):
+        """ A missing file raises like FileAsObj does. """
+        with self.assertRaises(IOError):
+            FileAsObjSet(self.names + ['/this/file/does/not/exist/'])
+
+    def test_save_changed_only(self):
+        """ Only changed members are written. """
+        test_set = FileAsObjSet(self.names)
+        test_set[self.names[2]].add('new line')
+        self.assertEqual(test_set.changed, [self.names[2]])
+        self.assertEqual(test_set.save(), [self.names[2]])
+        self.assertEqual(test_set.changed, [])
+        self.assertEqual(FileAsObj(self.names[2]).contents[-1], 'new line')
+
+    def test_factory(self):
+        """ A factory can set options on each member. """
+        def unique_file(filename):
+            test_file = FileAsObj()
+            test_file.unique = True
+            test_file.read(filename)
+            return test_file
+        test_set = FileAsObjSet(self.names, factory=unique_file)
+        self.assertFalse(test_set[self.names[0]].add('common'))
+
+
+
+class TestAsync(unittest.TestCase):
+    # class AsyncFileAsObj(FileAsObj):
+    def setUp(self):
+        test_file = FileAsObj()
+        test_file.filename = TESTFILE
+        test_file.add(TESTCONTENTS)
+        test_file.save()
+
+    def test_read_search_write(self):
+        """ Awaitable methods give the same answers as the blocking ones. """
+        async def work():
+            test_file = await AsyncFileAsObj.open(TESTFILE)
+            test_file.chunk_lines = 5
+            self.assertEqual(await test_file.agrep('www01'), FileAsObj(TESTFILE).grep('www01'))
+            self.assertEqual(await test_file.aegrep('^10.*'), FileAsObj(TESTFILE).egrep('^10.*'))
+            self.assertFalse(await test_file.agrep('not present'))
+            self.assertEqual(await test_file.acheck('#comment'), '#comment')
+            self.assertTrue(await test_file.aadd('async line'))
+            self.assertTrue(test_file.changed)
+            self.assertTrue(await test_file.asave())
+            self.assertFalse(test_file.changed)
+        asyncio.run(work())
+        self.assertEqual(FileAsObj(TESTFILE).contents[-1], 'async line')
+
+    def test_concurrent_coroutines(self):
+        """ Many coroutines can share one object; unique still holds. """
+        async def work():
+            test_file = AsyncFileAsObj()
+            test_file.unique = True
+            results = await asyncio.gather(*[test_file.aadd(str(this % 10)) for this in range(100)])
+            self.assertEqual(results.count(True), 10)
+            self.assertEqual(sorted(test_file.contents), [str(this) for this in range(10)])
+            searches = await asyncio.gather(*[test_file.agrep(str(this)) for this in range(10)])
+            self.assertEqual(searches, [[str(this)] for this in range(10)])
+        asyncio.run(work())
+
+
+class TestInstrument(unittest.TestCase):
+    # def instrument(self, callback=None):
+    def setUp(self):
+        with open(TESTFILE, 'w') as handle:
+            handle.write('one\ntwo\n')
+
+    def test_stats(self):
+        """ Calls, time, lines and bytes are counted per method, aliases included. """
+        test_file = FileAsObj()
+        stats = test_file.instrument()
+        test_file.read(TESTFILE)
+        test_file.add('three\nfour')
+        test_file.append('five')
+        self.assertTrue(test_file.grep('o'))
+        self.assertTrue('one' in test_file)
+        test_file.save()
+        self.assertIs(stats, test_file.stats)
+        self.assertEqual(stats['read']['calls'], 1)
+        self.assertEqual(stats['read']['lines'], 2)
+        self.assertEqual(stats['read']['bytes'], 8)
+        self.assertEqual(stats['add']['calls'], 2)
+        self.assertEqual(stats['add']['lines'], 3)
+        self.assertEqual(stats['grep']['lines'], 5)
+        self.assertEqual(stats['check']['calls'], 1)
+        self.assertEqual(stats['write']['lines'], 3)
+        self.assertEqual(stats['write']['bytes'], len('three\nfour\nfive\n'))
+        self.assertGreater(stats['read']['seconds'], 0)
+        self.assertGreaterEqual(stats['read']['seconds'], stats['read']['peak'])
+
+    def test_callback(self):
+        """ The callback hears about every call, failed ones too. """
+        heard = []
+        test_file = FileAsObj()
+        test_file.instrument(lambda name, seconds, lines, size: heard.append((name, lines, size)))
+        test_file.read(TESTFILE)
+        with self.assertRaises(TypeError):
+            test_file.add(1)
+        self.assertEqual(heard, [('read', 2, 8), ('add', 0, 0)])
+
+    def test_uninstrument(self):
+        """ Methods are plain again after uninstrument(), which keeps the figures. """
+        test_file = FileAsObj()
+        test_file.instrument()
+        self.assertIn('grep', test_file.__dict__)
+        test_file.grep('x')
+        test_file.uninstrument()
+        test_file.grep('x')
+        self.assertNotIn('grep', test_file.__dict__)
+        self.assertEqual(test_file.stats['grep']['calls'], 1)
+        self.assertIsNone(FileAsObj().stats)
+
+
+class TestBench(unittest.TestCase):
+    # def bench(sizes=SIZES, repeat=3, memory=True, operations=None, directory=None, report=None, objects=OBJECTS):
+    def test_bench(self):
+        """ The benchmark runs every chosen operation in every mode and reports JSON-ready results. """
+        results = bench.bench(sizes=[200], repeat=1, operations=['read', 'add', 'write'], objects=1000)
+        self.assertEqual(len(results['results']), 12)
+        self.assertEqual(results['construction']['objects'], 1000)
+        self.assertGreater(results['construction']['bytes_per_logged_object'],
+                           results['construction']['bytes_per_object'])
+        for result in results['results']:
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertGreater(result['peak_bytes'], 0)
+        self.assertTrue(bench.json.dumps(results))
+
+    def test_line(self):
+        """ Synthetic files repeat one line in ten. """
+        lines = [bench.line(number) for number in range(1000)]
+        self.assertEqual(len(set(lines)), 900)
+
+
+class TestFind(unittest.TestCase):
+    # def find(self, column, value):
+    def setUp(self):
+        self.fields = Fields(['address', 'hostname', 'aliases'], comment='#')
+        self.test_file = FileAsObj()
+        self.test_file.fields = self.fields
+        self.test_file.contents = TESTCONTENTS.split('\n')
+
+    def test_find(self):
+        """ Lines are found by the exact value of one column, comments and blank lines never match. """
+        self.assertEqual(self.test_file.find('hostname', 'web01'), ['10.0.0.1 web01 web01.example.com'])
+        self.assertEqual(self.test_file.find('address', '127.0.0.1'), ['127.0.0.1 localhost.localdomain localhost'])
+        self.assertFalse(self.test_file.find('hostname', 'web0'))
+        self.assertFalse(self.test_file.find('hostname', '#comment'))
+        with self.assertRaises(ValueError):
+            self.test_file.find('missing', 'web01')
+        with self.assertRaises(AttributeError):
+            FileAsObj().find('hostname', 'web01')
+
+    def test_updates(self):
+        """ The column index follows add(), rm() and replace(), duplicates included, in file order. """
+        self.test_file.unique = False
+        self.assertTrue(self.test_file.find('hostname', 'web01'))
+        self.test_file.add(['10.0.0.2 web01', '10.0.0.1 web01 web01.example.com'])
+        self.assertEqual(self.test_file.find('hostname', 'web01'), [
+            '10.0.0.1 web01 web01.example.com', '10.0.0.2 web01', '10.0.0.1 web01 web01.example.com'])
+        self.test_file.rm('10.0.0.1 web01 web01.example.com')
+        self.assertEqual(self.test_file.find('hostname', 'web01'), ['10.0.0.2 web01'])
+        self.test_file.replace('10.0.0.2 web01', '10.0.0.2 web02')
+        self.assertFalse(self.test_file.find('hostname', 'web01'))
+        self.assertEqual(self.test_file.find('address', '10.0.0.2'), ['10.0.0.2 web02'])
+        self.test_file.sorted = True
+        self.test_file.sort()
+        self.test_file.add('10.0.0.3 web03')
+        self.test_file.rm('10.0.0.2 web02')
+        self.assertEqual(self.test_file.find('hostname', 'web03'), ['10.0.0.3 web03'])
+        self.assertFalse(self.test_file.find('hostname', 'web02'))
+        self.test_file.contents = ['10.0.0.4 web04']
+        self.assertEqual(self.test_file.find('hostname', 'web04'), ['10.0.0.4 web04'])
+
+    def test_read(self):
+        """ Indexes are built on read(); unindexed columns are searched line by line. """
+        with open(TESTFILE, 'w') as handle:
+            handle.write('root:x:0:0:root:/root:/bin/bash\nbin:x:1:1:bin:/bin:/sbin/nologin\n')
+        test_file = FileAsObj(TESTFILE, fields=Fields(['user', 'password', 'uid', 'gid', 'gecos', 'home', 'shell'],
+                                                      delimiter=':', indexed=['user']))
+        self.assertEqual(test_file._keyed[('fields', 'user')][2], test_file.contents.version)
+        self.assertEqual(test_file.find('uid', '1'), ['bin:x:1:1:bin:/bin:/sbin/nologin'])
+        self.assertEqual(test_file.find('user', 'root'), ['root:x:0:0:root:/root:/bin/bash'])
+        self.assertEqual(test_file.fields.parse('bin:x:1:1:bin:/bin:/sbin/nologin')['shell'], '/sbin/nologin')
+
+    def test_split_once(self):
+        """ Indexing several columns splits each line once, on read() and on later updates. """
+        class Counted(Fields):
+            splits = 0
+
+            def split(self, line):
+                Counted.splits += 1
+                return Fields.split(self, line)
+        with open(TESTFILE, 'w') as handle:
+            handle.write('10.0.0.1 web01 www\n10.0.0.2 web02\n# comment\n')
+        test_file = FileAsObj(TESTFILE, fields=Counted(['address', 'hostname', 'aliases'], comment='#'))
+        self.assertEqual(Counted.splits, 3)
+        test_file.add('10.0.0.3 web03')
+        test_file.rm('10.0.0.2 web02')
+        self.assertEqual(Counted.splits, 5)
+        test_file.contents.append('10.0.0.4 web04')
+        self.assertEqual(test_file.find('aliases', 'www'), ['10.0.0.1 web01 www'])
+        self.assertEqual(test_file.find('hostname', 'web04'), ['10.0.0.4 web04'])
+        self.assertEqual(Counted.splits, 9)
+
+    def test_pattern(self):
+        """ A regex schema takes its columns from the pattern's groups. """
+        self.test_file.fields = Fields(['address', 'domain'], pattern=r'(\S+)\s+\S+\.(example\.com)')
+        self.assertEqual(self.test_file.find('domain', 'example.com'), ['172.19.18.17    freebird.example.com'])
+        self.assertEqual(list(self.test_file._keyed), [('fields', 'domain')])
+
+
+class TestKeyIndex(unittest.TestCase):
+    # def create_index(self, name, key):
+    def setUp(self):
+        self.test_file = FileAsObj()
+        self.test_file.contents = TESTCONTENTS.split('\n')
+        self.test_file.create_index('address', r'^(\d+\.\d+\.\d+\.\d+)\s')
+
+    def test_lookup(self):
+        """ Lines are looked up by the first group of a regex, or by a callable. """
+        self.assertEqual(self.test_file.lookup('address', '10.0.0.1'), ['10.0.0.1 web01 web01.example.com'])
+        self.assertFalse(self.test_file.lookup('address', '10.0.0.5'))
+        self.test_file.create_index('words', lambda line: len(line.split()) if line[:1].isdigit() else None)
+        self.assertEqual(self.test_file.lookup('words', 2), ['172.19.18.17    freebird.example.com'])
+        with self.assertRaises(ValueError):
+            self.test_file.lookup('missing', 'x')
+        self.assertTrue(self.test_file.drop_index('words'))
+        self.assertFalse(self.test_file.drop_index('words'))
+
+    def test_lookup_after_update(self):
+        """ After an update lines are put in file order by one pass, without building the line index again. """
+        self.test_file.unique = False
+        self.test_file.add(['10.0.0.1 web02', '10.0.0.9 other', '10.0.0.1 web02'])
+        self.assertTrue(self.test_file.rm('10.0.0.9 other'))
+        self.assertIsNone(self.test_file._index)
+        self.assertEqual(self.test_file.lookup('address', '10.0.0.1'), [
+            '10.0.0.1 web01 web01.example.com', '10.0.0.1 web02', '10.0.0.1 web02'])
+        self.assertIsNone(self.test_file._index)
+        self.test_file.check('10.0.0.1 web02')
+        self.test_file.check('10.0.0.1 web02')  # Builds the index.
+        self.test_file._line_places()
+        self.assertEqual(self.test_file.lookup('address', '10.0.0.1'), [
+            '10.0.0.1 web01 web01.example.com', '10.0.0.1 web02', '10.0.0.1 web02'])
+
+    def test_rm_by(self):
+        """ rm_by() removes every line with the key, the index follows. """
+        self.test_file.add('10.0.0.1 web02')
+        self.assertTrue(self.test_file.rm_by('address', '10.0.0.1'))
+        self.assertFalse(self.test_file.check('10.0.0.1 web02'))
+        self.assertFalse(self.test_file.lookup('address', '10.0.0.1'))
+        self.assertFalse(self.test_file.rm_by('address', '10.0.0.1'))
+
+    def test_replace_by(self):
+        """ replace_by() replaces every line with the key, the index follows. """
+        self.assertTrue(self.test_file.replace_by('address', '10.0.0.1', '10.0.0.5 web01'))
+        self.assertFalse(self.test_file.lookup('address', '10.0.0.1'))
+        self.assertEqual(self.test_file.lookup('address', '10.0.0.5'), ['10.0.0.5 web01'])
+        self.assertFalse(self.test_file.replace_by('address', '10.0.0.1', 'x'))
+
+    def test_lazy(self):
+        """ An index made on a lazy file is built when first used, and rebuilt after reading again. """
+        with open(TESTFILE, 'w') as handle:
+            handle.write('10.0.0.1 one\n10.0.0.2 two\n')
+        test_file = FileAsObj(TESTFILE, lazy=True)
+        test_file.create_index('address', r'^(\S+)')
+        self.assertIsNone(test_file._contents)
+        self.assertEqual(test_file.lookup('address', '10.0.0.2'), ['10.0.0.2 two'])
+        with open(TESTFILE, 'w') as handle:
+            handle.write('10.0.0.3 three\n10.0.0.4 four\n')
+        test_file.contents = list()
+        test_file.read(TESTFILE)
+        self.assertFalse(test_file.lookup('address', '10.0.0.2'))
+        self.assertEqual(test_file.lookup('address', '10.0.0.4'), ['10.0.0.4 four'])
+
+
+class TestStartswith(unittest.TestCase):
+    # def startswith(self, prefix):
+    def setUp(self):
+        self.test_file = FileAsObj()
+        self.test_file.contents = TESTCONTENTS.split('\n')
+
+    def test_startswith(self):
+        """ Indexed or not, lines are returned in file order with duplicates. """
+        expected = [line for line in TESTCONTENTS.split('\n') if line.startswith('#')]
+        self.assertEqual(self.test_file.startswith('#'), expected)
+        self.test_file.prefix_index = True
+        self.assertEqual(self.test_file.startswith('#'), expected)
+        self.assertFalse(self.test_file.startswith('192.169.'))
+        self.test_file.add('#comment')
+        self.assertEqual(self.test_file.startswith('#com'), ['#comment', '#comment'])
+        with self.assertRaises(TypeError):
+            self.test_file.startswith(b'#')
+
+    def test_updates(self):
+        """ The prefix index follows add(), rm(), replace() and new contents. """
+        self.test_file.prefix_index = True
+        self.assertTrue(self.test_file.startswith('10.'))
+        self.test_file.add(['10.0.0.2 web02', '10.1.0.1 db01'])
+        self.assertEqual(self.test_file.startswith('10.0.'), ['10.0.0.1 web01 web01.example.com', '10.0.0.2 web02'])
+        self.test_file.rm('10.0.0.1 web01 web01.example.com')
+        self.test_file.replace('10.1.0.1 db01', '10.0.0.3 db01')
+        self.assertEqual(self.test_file.startswith('10.0.'), ['10.0.0.2 web02', '10.0.0.3 db01'])
+        self.test_file.add(['10.2.0.{0}'.format(this) for this in range(100)])
+        self.assertEqual(len(self.test_file.startswith('10.2.0.')), 100)
+        self.test_file.contents = ['10.3.0.1 new']
+        self.assertEqual(self.test_file.startswith('10.'), ['10.3.0.1 new'])
+
+    def test_rm_prefix(self):
+        """ rm_prefix() removes every line with the prefix. """
+        for indexed in (False, True):
+            test_file = FileAsObj()
+            test_file.prefix_index = indexed
+            test_file.contents = TESTCONTENTS.split('\n')
+            self.assertTrue(test_file.rm_prefix('#'))
+            self.assertFalse(test_file.startswith('#'))
+            self.assertTrue(test_file.check('    #spaced comment'))
+            self.assertFalse(test_file.rm_prefix('#'))
+
+    def test_egrep(self):
+        """ egrep() answers '^literal' patterns from the prefix index, with the same results. """
+        self.test_file.prefix_index = True
+        for pattern in (r'^10\.0\.', '^#', r'^#\s', '^1.*host', r'^\d'):
+            self.test_file.prefix_index = False
+            expected = self.test_file.egrep(pattern)
+            self.test_file.prefix_index = True
+            self.assertEqual(self.test_file.egrep(pattern), expected)
+        self.assertIsNotNone(self.test_file._prefix)
+
+
+class TestGrepIndex(unittest.TestCase):
+    # def grep(self, needle, workers=None):  with grep_index = True
+    def setUp(self):
+        with open(TESTFILE, 'w') as handle:
+            handle.write(TESTCONTENTS)
+        self.plain = FileAsObj(TESTFILE)
+        self.test_file = FileAsObj()
+        self.test_file.grep_index = True
+        self.test_file.read(TESTFILE)
+
+    def test_grep(self):
+        """ Results match an unindexed grep(), short and missing needles included. """
+        self.assertIsNotNone(self.test_file._grams)
+        for needle in ('example', 'web01', 'host', '#', '10', 'www01   www01', 'missing', ''):
+            self.assertEqual(self.test_file.grep(needle), self.plain.grep(needle), needle)
+
+    def test_updates(self):
+        """ The trigram index follows add(), rm(), replace() and new contents. """
+        for test_file in (self.plain, self.test_file):
+            test_file.add(['10.9.9.9 zebra01', '10.9.9.9 zebra01'])
+            test_file.rm('10.0.0.1 web01 web01.example.com')
+            test_file.replace('172.19.18.17    freebird.example.com', '172.19.18.17    zebra02')
+        for needle in ('zebra', 'web01', 'freebird', '10.9.9.9'):
+            self.assertEqual(self.test_file.grep(needle), self.plain.grep(needle), needle)
+        self.assertEqual(len(self.test_file.grep('zebra01')), 2)
+        self.test_file.rm(self.test_file.grep('e'))
+        self.assertIsNone(self.test_file._grams[1])  # Most lines are gone, the index is rebuilt on next use.
+        self.assertFalse(self.test_file.grep('zebra'))
+        self.test_file.contents = ['new zebra03']
+        self.assertEqual(self.test_file.grep('zebra'), ['new zebra03'])
+        with self.assertRaises(TypeError):
+            self.test_file.grep(b'zebra')
+
+
 if __name__ == '__main__':
     unittest.main()
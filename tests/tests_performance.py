@@ -0,0 +1,297 @@
+""" -*- coding: utf-8 -*-
+Performance regression tests for FileAsObj.
+
+Two kinds of checks:
+    * Scaling: each operation is timed at several sizes and the exponent k of time ~ size**k is fitted, so an
+        accidental O(n**2) shows up however fast the machine is.
+    * Baseline: each operation is timed at one size and compared, relative to a fixed pure-Python workload that
+        cancels out the speed of the machine, with tests/performance_baseline.json.
+
+Hint:
+# PYTHONPATH=`pwd` python3 tests/tests_performance.py
+# FILEASOBJ_UPDATE_BASELINE=1 PYTHONPATH=`pwd` python3 tests/tests_performance.py   (after a deliberate change)
+# FILEASOBJ_PERF_TOLERANCE=4 ...   (allow up to 4x the baseline, default 2.5)
+# FILEASOBJ_SKIP_PERFORMANCE=1 ...   (skip on machines too noisy to time)
+
+"""
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from fileasobj import FileAsObj
+from fileasobj.bench import construction, generate, line
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'performance_baseline.json')
+
+# Sizes, in lines, used to fit scaling exponents. Each is four times the last so the fit spans a wide range.
+SIZES = (5000, 20000, 80000)
+
+# Lines used for the baseline comparison.
+BASELINE_SIZE = 50000
+
+# Highest fitted exponent accepted for operations that should be linear. n log n, and caches and hash tables that
+# outgrow the CPU cache, fit a little above 1; anything quadratic fits near 2.
+LINEAR = 1.5
+
+SKIP = os.environ.get('FILEASOBJ_SKIP_PERFORMANCE') == '1'
+
+
+def best_time(function, repeat=5):
+    """ Return the fastest of 'repeat' calls to 'function', in seconds. 'function' returns a callable to time. """
+    best = None
+    for _ in range(repeat):
+        timed = function()
+        start = time.perf_counter()
+        timed()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def exponent(sizes, seconds):
+    """ Return the least-squares slope of log(seconds) against log(sizes). """
+    xs = [math.log(this) for this in sizes]
+    ys = [math.log(max(this, 1e-9)) for this in seconds]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def calibrate():
+    """ Time a fixed pure-Python workload, the unit baseline timings are expressed in. """
+    def workload():
+        index = dict()
+        for number in range(200000):
+            index['line {0}'.format(number)] = number
+        return sorted(index)
+    return best_time(lambda: workload)
+
+
+class Workload(object):
+    """ Generated files and the operations timed on them, shared by the test cases below. """
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='fileasobj-perf-')
+        self.files = dict()
+
+    def filename(self, size):
+        """ Return the name of a generated file of 'size' lines, creating it on first use. """
+        if size not in self.files:
+            self.files[size] = os.path.join(self.directory, '{0}.txt'.format(size))
+            generate(self.files[size], size)
+        return self.files[size]
+
+    def opened(self, size, unique=False, ordered=False):
+        """ Return a FileAsObj of the file of 'size' lines. """
+        test_file = FileAsObj()
+        test_file.unique = unique
+        test_file.sorted = ordered
+        test_file.read(self.filename(size))
+        return test_file
+
+    def close(self):
+        """ Remove the generated files. """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _read(workload, size, unique=False, ordered=False):
+    """ read() the file of 'size' lines into a new object. """
+    def prepare():
+        filename = workload.filename(size)
+        test_file = FileAsObj()
+        test_file.unique = unique
+        test_file.sorted = ordered
+        return lambda: test_file.read(filename)
+    return prepare
+
+
+def _add_each(workload, size, unique=True):
+    """ add() 'size' lines one call at a time to an empty object: linear in total lines if add() is O(1). """
+    def prepare():
+        test_file = FileAsObj()
+        test_file.unique = unique
+        lines = [line(number) for number in range(size)]
+
+        def timed():
+            for this in lines:
+                test_file.add(this)
+        return timed
+    return prepare
+
+
+def _call(workload, size, method, *args, **options):
+    """ Call 'method' with 'args' on a freshly read file of 'size' lines. """
+    def prepare():
+        test_file = workload.opened(size, **options)
+        return lambda: getattr(test_file, method)(*args)
+    return prepare
+
+
+def _rm_many(workload, size):
+    """ rm() a tenth of the lines in one call. """
+    def prepare():
+        test_file = workload.opened(size)
+        doomed = [line(number) for number in range(0, size, 10)]
+        return lambda: test_file.rm(doomed)
+    return prepare
+
+
+def _check_each(workload, size):
+    """ check() every tenth line: linear in total if each check() is O(1) once the index is built. """
+    def prepare():
+        test_file = workload.opened(size)
+        lines = [line(number) for number in range(0, size, 10)]
+        return lambda: [test_file.check(this) for this in lines]
+    return prepare
+
+
+def _write(workload, size):
+    """ write() a freshly read file of 'size' lines to a new file. """
+    def prepare():
+        test_file = workload.opened(size)
+        test_file.filename = os.path.join(workload.directory, 'written.txt')
+        return test_file.write
+    return prepare
+
+
+def _construct(workload, size):
+    """ Create 'size' empty objects, as batch jobs handling many files do. """
+    def prepare():
+        return lambda: [FileAsObj() for _ in range(size)]
+    return prepare
+
+
+# name -> function(workload, size) returning a 'prepare' callable for best_time().
+OPERATIONS = {
+    'read': lambda workload, size: _read(workload, size),
+    'read_unique': lambda workload, size: _read(workload, size, unique=True),
+    'read_sorted': lambda workload, size: _read(workload, size, ordered=True),
+    'add_each_unique': lambda workload, size: _add_each(workload, size),
+    'add_batch_sorted': lambda workload, size: _call(workload, size, 'add', [line(size + this) for this in range(size)],
+                                                     unique=True, ordered=True),
+    'check_each': _check_each,
+    'rm_many': _rm_many,
+    'replace': lambda workload, size: _call(workload, size, 'replace', [line(size // 2), line(size // 3)], 'new'),
+    'grep': lambda workload, size: _call(workload, size, 'grep', 'host1'),
+    'egrep': lambda workload, size: _call(workload, size, 'egrep', r'^10\.0\.1\.'),
+    'grep_any': lambda workload, size: _call(workload, size, 'grep_any',
+                                             ['host{0}'.format(this) for this in range(10)]),
+    'sort': lambda workload, size: _call(workload, size, 'sort'),
+    'write': _write,
+    'construct': _construct,
+}
+
+# Most bytes an empty FileAsObj may hold, its own and what it allocates on construction.
+OBJECT_BYTES = 640
+
+
+@unittest.skipIf(SKIP, 'FILEASOBJ_SKIP_PERFORMANCE=1')
+class TestScaling(unittest.TestCase):
+    """ Every operation must grow no faster than linearly (within LINEAR) with the number of lines. """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workload = Workload()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workload.close()
+
+    def assertScales(self, name, limit=LINEAR):
+        seconds = [best_time(OPERATIONS[name](self.workload, size), repeat=3) for size in SIZES]
+        fitted = exponent(SIZES, seconds)
+        self.assertLess(fitted, limit, '{0} grows as n**{1:.2f} ({2})'.format(
+            name, fitted, ', '.join('{0}: {1:.4f}s'.format(size, this) for size, this in zip(SIZES, seconds))))
+
+    def test_read(self):
+        self.assertScales('read')
+
+    def test_read_unique(self):
+        self.assertScales('read_unique')
+
+    def test_read_sorted(self):
+        self.assertScales('read_sorted')
+
+    def test_add_each_unique(self):
+        """ add() with unique=True must be ~linear in total lines, not quadratic. """
+        self.assertScales('add_each_unique')
+
+    def test_add_batch_sorted(self):
+        self.assertScales('add_batch_sorted')
+
+    def test_check_each(self):
+        self.assertScales('check_each')
+
+    def test_rm_many(self):
+        self.assertScales('rm_many')
+
+    def test_replace(self):
+        self.assertScales('replace')
+
+    def test_grep(self):
+        self.assertScales('grep')
+
+    def test_egrep(self):
+        self.assertScales('egrep')
+
+    def test_grep_any(self):
+        self.assertScales('grep_any')
+
+    def test_sort(self):
+        self.assertScales('sort')
+
+    def test_write(self):
+        self.assertScales('write')
+
+    def test_construct(self):
+        self.assertScales('construct')
+
+
+@unittest.skipIf(SKIP, 'FILEASOBJ_SKIP_PERFORMANCE=1')
+class TestConstruction(unittest.TestCase):
+    """ Empty objects must stay small, or batch jobs creating many of them run out of memory. """
+
+    def test_bytes_per_object(self):
+        measured = construction(10000)
+        self.assertLess(measured['bytes_per_object'], OBJECT_BYTES, measured)
+
+
+def measure_baseline(workload):
+    """ Return Dict; operation name -> time at BASELINE_SIZE in units of calibrate(). """
+    unit = calibrate()
+    return dict((name, best_time(operation(workload, BASELINE_SIZE)) / unit)
+                for name, operation in sorted(OPERATIONS.items()))
+
+
+@unittest.skipIf(SKIP, 'FILEASOBJ_SKIP_PERFORMANCE=1')
+class TestBaseline(unittest.TestCase):
+    """ No operation may get slower than the stored baseline by more than the tolerance. """
+
+    def test_against_baseline(self):
+        workload = Workload()
+        try:
+            current = measure_baseline(workload)
+        finally:
+            workload.close()
+        if os.environ.get('FILEASOBJ_UPDATE_BASELINE') == '1':
+            with open(BASELINE, 'w') as handle:
+                json.dump({'size': BASELINE_SIZE, 'relative_seconds': current}, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+        if not os.path.exists(BASELINE):
+            self.skipTest('no baseline at {0}, create one with FILEASOBJ_UPDATE_BASELINE=1'.format(BASELINE))
+        with open(BASELINE) as handle:
+            baseline = json.load(handle)
+        self.assertEqual(baseline['size'], BASELINE_SIZE)
+        tolerance = float(os.environ.get('FILEASOBJ_PERF_TOLERANCE', '2.5'))
+        slower = ['{0}: {1:.3f} vs baseline {2:.3f}'.format(name, current[name], expected)
+                  for name, expected in sorted(baseline['relative_seconds'].items())
+                  if name in current and current[name] > expected * tolerance]
+        self.assertEqual(slower, [], 'slower than {0}x the baseline'.format(tolerance))
+
+
+if __name__ == '__main__':
+    unittest.main()